@@ -0,0 +1,124 @@
+import threading
+
+from sqlalchemy import select
+
+from backend import metrics
+from backend.database import database, models
+
+class CatalogIndex:
+    """
+    The products table held in memory as {barcode: (name, price)}, so the
+    scan path finds catalog names and prices with a dict lookup. A background
+    thread polls catalog_state (one row) every `refresh_interval` seconds and
+    fetches only the products whose version is newer than the one loaded;
+    deletions and barcode renames trigger a full reload.
+    """
+    def __init__(self, session_factory=None, refresh_interval=5.0):
+        self.session_factory = session_factory or database.SessionLocal
+        self.refresh_interval = refresh_interval
+
+        self._entries = {}
+        self.version = -1      # Nothing loaded yet
+        self.deletions = -1
+        self._lock = threading.Lock()  # One refresh at a time; readers never wait
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = False
+        self.counters = {"hits": 0, "misses": 0, "reloads": 0, "updates": 0, "errors": 0}
+
+    def get(self, barcode):
+        """Returns (name, price) of a catalog product, or None."""
+        entry = self._entries.get(barcode)
+        self.counters["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    def get_many(self, barcodes):
+        """Returns {barcode: (name, price)} for the barcodes that are in the catalog."""
+        entries = self._entries
+        found = {barcode: entries[barcode] for barcode in barcodes if barcode in entries}
+        self.counters["hits"] += len(found)
+        self.counters["misses"] += len(barcodes) - len(found)
+        return found
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        """Reads the whole catalog and swaps it in at once."""
+        with self._lock:
+            db = self.session_factory()
+            try:
+                version, deletions = self._state(db)
+                product = models.Product
+                rows = db.execute(select(product.barcode, product.name, product.price))
+                self._entries = {barcode: (name, price) for barcode, name, price in rows}
+            finally:
+                db.close()
+            self.version, self.deletions = version, deletions
+            self.counters["reloads"] += 1
+        return len(self._entries)
+
+    def refresh(self):
+        """Applies the catalog changes since the loaded version. Returns the products updated."""
+        with self._lock:
+            db = self.session_factory()
+            try:
+                version, deletions = self._state(db)
+                if deletions != self.deletions:
+                    reload = True
+                elif version == self.version:
+                    return 0
+                else:
+                    reload = False
+                    product = models.Product
+                    rows = db.execute(select(product.barcode, product.name, product.price)
+                                      .where(product.version > self.version)).all()
+            finally:
+                db.close()
+
+            if not reload:
+                # Copy-on-write: lookups keep using the old dict meanwhile
+                entries = dict(self._entries)
+                entries.update((barcode, (name, price)) for barcode, name, price in rows)
+                self._entries = entries
+                self.version = version
+                self.counters["updates"] += len(rows)
+                return len(rows)
+
+        return self.load()
+
+    @staticmethod
+    def _state(db):
+        state = db.get(models.CatalogState, 1)
+        return (state.version, state.deletions) if state else (0, 0)
+
+    def start(self):
+        if self.started:
+            return self
+        self.load()
+        self.started = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                updated = self.refresh()
+                if updated:
+                    print(f"[INFO] Catalog refreshed: {updated} products (version {self.version})")
+            except Exception as e:
+                self.counters["errors"] += 1
+                metrics.ERRORS.inc("catalog")
+                print(f"[ERROR] Catalog refresh failed: {e}")
+
+    def stop(self, timeout=5.0):
+        if not self.started:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self.started = False
+
+    def get_stats(self):
+        return dict(self.counters, products=len(self._entries), version=self.version)
@@ -0,0 +1,92 @@
+import os
+
+# Runtime settings. Every value can be overridden with an environment variable
+# so each till can be tuned without touching the code.
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _parse_cameras(value):
+    """
+    "0" -> [("lane1", 0)]; "caja1=0,caja2=rtsp://..." -> [("caja1", 0), ("caja2", "rtsp://...")]
+    Numeric sources are camera indexes, anything else is passed to OpenCV as-is.
+    """
+    cameras = []
+    for i, item in enumerate(x.strip() for x in value.split(",") if x.strip()):
+        name, sep, rest = item.partition("=")
+        if sep and "/" not in name and ":" not in name:
+            lane_id, src = name, rest
+        else:
+            lane_id, src = f"lane{i + 1}", item
+        cameras.append((lane_id, int(src) if src.isdigit() else src))
+    return cameras or [("lane1", 0)]
+
+# Cameras / lanes
+CAMERAS = _parse_cameras(os.environ.get("SCANNER_CAMERAS", "0"))
+DECODE_WORKERS = _env_int("SCANNER_DECODE_WORKERS", 0)     # 0 = decode in a thread per lane, N = pool of N processes
+
+# Camera capture (ignored for video files). 1280x720 is within the width the
+# detector decodes without resizing (BarcodeDetector.MIN_WIDTH..MAX_WIDTH).
+CAPTURE_WIDTH = _env_int("SCANNER_CAPTURE_WIDTH", 1280)      # 0 = camera default
+CAPTURE_HEIGHT = _env_int("SCANNER_CAPTURE_HEIGHT", 720)
+CAPTURE_FPS = _env_float("SCANNER_CAPTURE_FPS", 30.0)        # 0 = camera default
+CAPTURE_FOURCC = os.environ.get("SCANNER_CAPTURE_FOURCC", "MJPG")  # MJPG, YUYV or empty for the camera default
+CAPTURE_BACKEND = os.environ.get("SCANNER_CAPTURE_BACKEND", "auto").lower()  # auto, dshow, msmf, v4l2, avfoundation, ffmpeg, gstreamer, any
+CAPTURE_LOOP = _env_int("SCANNER_CAPTURE_LOOP", 1)           # Video files start over at the end
+
+# Detection pipeline
+DECODE_FPS = _env_float("SCANNER_DECODE_FPS", 10.0)    # How many frames per second go through pyzbar
+STREAM_FPS = _env_float("SCANNER_STREAM_FPS", 25.0)    # Frame rate of the MJPEG /video_feed
+OVERLAY_TTL = _env_float("SCANNER_OVERLAY_TTL", 0.5)   # Seconds a detection box stays drawn on the stream
+DECODE_BUDGET_MS = _env_float("SCANNER_DECODE_BUDGET_MS", 40.0) # Time budget per frame for the fallback decode passes
+DECODE_GATE = _env_int("SCANNER_DECODE_GATE", 1)                # 1 = skip pyzbar on static/featureless frames
+OPENCV_LOCALIZER = _env_int("SCANNER_OPENCV_LOCALIZER", 0)      # 1 = propose regions with cv2.barcode (slower, more precise)
+TRACK_CONFIRM_READS = _env_int("SCANNER_TRACK_CONFIRM_READS", 2) # Agreeing reads before a code is reported (0 = no tracking)
+TRACK_FULL_EVERY = _env_int("SCANNER_TRACK_FULL_EVERY", 10)      # While codes are tracked, full-frame decode every N frames
+TRACK_REGION_EVERY = _env_int("SCANNER_TRACK_REGION_EVERY", 2)   # ... and decode just the tracked boxes every N frames
+
+# Duplicate filtering
+DEDUP_INTERVAL = _env_float("SCANNER_DEDUP_INTERVAL", 5.0)      # Seconds a scanned code is ignored on the same lane
+DEDUP_MAX_ENTRIES = _env_int("SCANNER_DEDUP_MAX_ENTRIES", 4096) # Codes remembered at most (oldest dropped first)
+DEDUP_CONFIRM_FRAMES = _env_int("SCANNER_DEDUP_CONFIRM_FRAMES", 1) # Consecutive frames a code must be read in before it counts
+DEDUP_PER_LANE = _env_int("SCANNER_DEDUP_PER_LANE", 1)          # 0 = a code scanned on any lane is a duplicate on all of them
+
+# MJPEG stream encoding
+JPEG_QUALITY = _env_int("SCANNER_JPEG_QUALITY", 80)         # 1-100, lower means less bandwidth/CPU
+STREAM_MAX_WIDTH = _env_int("SCANNER_STREAM_MAX_WIDTH", 1280) # Frames wider than this are downscaled (0 = never)
+
+# Product name cache
+NAME_CACHE_SIZE = _env_int("SCANNER_NAME_CACHE_SIZE", 1024)               # Entries kept in memory (LRU)
+NAME_CACHE_TTL = _env_float("SCANNER_NAME_CACHE_TTL", 30 * 24 * 3600)     # Seconds a resolved name is trusted
+NAME_CACHE_NEGATIVE_TTL = _env_float("SCANNER_NAME_CACHE_NEGATIVE_TTL", 3600) # Seconds a "not found" is trusted
+NAME_LOOKUP_TIMEOUT = _env_float("SCANNER_NAME_LOOKUP_TIMEOUT", 2.0)     # Seconds per remote API request
+NAME_LOOKUP_WORKERS = _env_int("SCANNER_NAME_LOOKUP_WORKERS", 8)          # Concurrent remote API requests
+
+# Product catalog
+CATALOG_REFRESH_INTERVAL = _env_float("SCANNER_CATALOG_REFRESH_INTERVAL", 5.0) # Seconds between checks for catalog changes
+
+# Push events (/api/events)
+EVENT_QUEUE_SIZE = _env_int("SCANNER_EVENT_QUEUE_SIZE", 256)  # Events kept per client before the oldest are dropped
+
+# Scan persistence
+WRITE_BATCH_SIZE = _env_int("SCANNER_WRITE_BATCH_SIZE", 200)          # Max scans per transaction
+WRITE_FLUSH_INTERVAL = _env_float("SCANNER_WRITE_FLUSH_INTERVAL", 0.0) # Extra seconds a batch waits to fill (0 = group commit only)
+
+# Backups
+BACKUP_DIR = os.environ.get("SCANNER_BACKUP_DIR", "backups")
+BACKUP_INTERVAL = _env_float("SCANNER_BACKUP_INTERVAL", 600)   # Seconds between snapshots (skipped if nothing changed)
+BACKUP_KEEP_HOURS = _env_int("SCANNER_BACKUP_KEEP_HOURS", 24)  # Keep one snapshot per hour for this many hours
+BACKUP_KEEP_DAYS = _env_int("SCANNER_BACKUP_KEEP_DAYS", 30)    # Keep one snapshot per day for this many days
+
+# Diagnostics
+PROFILER = _env_int("SCANNER_PROFILER", 0)                    # 1 = enable the /admin/profile sampling profiler
+SLOW_FRAME_MS = _env_float("SCANNER_SLOW_FRAME_MS", 0.0)      # Log stage timings of frames slower than this (0 = off)
@@ -1,31 +1,211 @@
 import csv
 import json
 import io
-from datetime import datetime
-from sqlalchemy.orm import Session
-from . import models
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from . import database, models
+from .. import metrics
 
-def export_to_csv(db: Session):
-    codes = db.query(models.ScannedCode).all()
+# Columns of the CSV/JSON exports
+EXPORT_COLUMNS = ("id", "data", "type", "timestamp")
+
+def iter_code_rows(session_factory=None, chunk_size=1000):
+    """
+    Yields lists of up to chunk_size (id, data, type, timestamp) rows. The
+    query is read through a server-side cursor in its own session, so memory
+    stays flat no matter how many scans there are.
+    """
+    db = (session_factory or database.SessionLocal)()
+    try:
+        columns = [getattr(models.ScannedCode, name) for name in EXPORT_COLUMNS]
+        result = db.execute(select(*columns).order_by(models.ScannedCode.id)
+                            .execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+def _row_to_dict(row):
+    id_, data, type_, timestamp = row
+    return {
+        'id': id_,
+        'data': data,
+        'type': type_,
+        'timestamp': timestamp.isoformat() if timestamp else None
+    }
+
+def iter_csv(session_factory=None, chunk_size=1000):
     output = io.StringIO()
     writer = csv.writer(output)
-    
+
     # Header
     writer.writerow(['ID', 'Data', 'Type', 'Timestamp'])
-    
-    for code in codes:
-        writer.writerow([code.id, code.data, code.type, code.timestamp])
-        
-    return output.getvalue()
-
-def export_to_json(db: Session):
-    codes = db.query(models.ScannedCode).all()
-    data = []
-    for code in codes:
-        data.append({
-            'id': code.id,
-            'data': code.data,
-            'type': code.type,
-            'timestamp': code.timestamp.isoformat() if code.timestamp else None
-        })
-    return data
+
+    for rows in iter_code_rows(session_factory, chunk_size):
+        writer.writerows(rows)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+    if output.tell():
+        yield output.getvalue()
+
+def iter_ndjson(session_factory=None, chunk_size=1000):
+    for rows in iter_code_rows(session_factory, chunk_size):
+        yield "".join(json.dumps(_row_to_dict(row)) + "\n" for row in rows)
+
+def iter_json(session_factory=None, chunk_size=1000):
+    """The same JSON array as before, produced a chunk at a time."""
+    yield "["
+    first = True
+    for rows in iter_code_rows(session_factory, chunk_size):
+        chunk = ",".join(json.dumps(_row_to_dict(row)) for row in rows)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
+
+class BackupManager:
+    """
+    Periodic snapshots of the live database with SQLite's online backup
+    API. Pages are copied in small steps with a pause in between, so the
+    app keeps writing while a backup runs, and every copy is consistent
+    (unlike copying the file). A snapshot is skipped when nothing was
+    committed since the previous one.
+
+    Retention keeps one snapshot per hour for `keep_hours` hours and one per
+    day for `keep_days` days; the newest snapshot is always kept.
+    """
+    FILENAME_FORMAT = "barcodes_%Y%m%d-%H%M%S.db"
+
+    def __init__(self, db_path=None, backup_dir="backups", interval=600, keep_hours=24,
+                 keep_days=30, pages_per_step=256, step_sleep=0.005):
+        self.db_path = db_path or database.engine.url.database
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep_hours = keep_hours
+        self.keep_days = keep_days
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+
+        # Kept open: PRAGMA data_version only changes when *other* connections commit
+        self._source = None
+        self._last_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            "backups": 0, "skipped_unchanged": 0, "errors": 0, "pruned": 0,
+            "last_backup_at": None, "last_path": None,
+            "last_duration_s": None, "last_size_bytes": None,
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30.0)
+            self._thread = None
+        with self._lock:
+            if self._source is not None:
+                self._source.close()
+                self._source = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                self.stats["errors"] += 1
+                metrics.ERRORS.inc("backup")
+                print(f"[ERROR] Backup failed: {e}")
+
+    def snapshot(self, force=False):
+        """Backs up the database now. Returns the new file, or None if skipped."""
+        with self._lock:
+            if not os.path.exists(self.db_path):
+                return None
+            if self._source is None:
+                self._source = sqlite3.connect(self.db_path, check_same_thread=False)
+
+            version = self._source.execute("PRAGMA data_version").fetchone()[0]
+            if not force and version == self._last_version:
+                self.stats["skipped_unchanged"] += 1
+                return None
+
+            os.makedirs(self.backup_dir, exist_ok=True)
+            path = os.path.join(self.backup_dir, datetime.now().strftime(self.FILENAME_FORMAT))
+            tmp_path = path + ".tmp"
+
+            start = time.perf_counter()
+            target = sqlite3.connect(tmp_path)
+            try:
+                # Copies pages_per_step pages at a time, sleeping in between
+                self._source.backup(target, pages=self.pages_per_step, sleep=self.step_sleep)
+            finally:
+                target.close()
+            os.replace(tmp_path, path)
+
+            self._last_version = version
+            self.stats.update({
+                "backups": self.stats["backups"] + 1,
+                "last_backup_at": datetime.now().isoformat(),
+                "last_path": path,
+                "last_duration_s": round(time.perf_counter() - start, 3),
+                "last_size_bytes": os.path.getsize(path),
+            })
+            print(f"[INFO] Automatic backup created: {path}")
+
+        self.prune()
+        return path
+
+    def _list_backups(self):
+        """[(datetime, path)] of the snapshots in backup_dir, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        found = []
+        for name in os.listdir(self.backup_dir):
+            try:
+                found.append((datetime.strptime(name, self.FILENAME_FORMAT),
+                              os.path.join(self.backup_dir, name)))
+            except ValueError:
+                continue  # Not one of ours
+        return sorted(found, reverse=True)
+
+    def prune(self, now=None):
+        """Deletes the snapshots the retention policy does not keep. Returns them."""
+        now = now or datetime.now()
+        backups = self._list_backups()
+        keep = set(path for _, path in backups[:1])
+        hours_seen, days_seen = set(), set()
+
+        for taken_at, path in backups:
+            age = now - taken_at
+            hour = taken_at.strftime("%Y%m%d%H")
+            day = taken_at.strftime("%Y%m%d")
+            # Newest snapshot of each hour / day wins
+            if age <= timedelta(hours=self.keep_hours) and hour not in hours_seen:
+                hours_seen.add(hour)
+                keep.add(path)
+            if age <= timedelta(days=self.keep_days) and day not in days_seen:
+                days_seen.add(day)
+                keep.add(path)
+
+        removed = [path for _, path in backups if path not in keep]
+        for path in removed:
+            os.remove(path)
+        self.stats["pruned"] += len(removed)
+        return removed
+
+    def get_stats(self):
+        return dict(self.stats, retained=len(self._list_backups()))
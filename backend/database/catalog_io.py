@@ -0,0 +1,230 @@
+import codecs
+import csv
+import io
+import json
+import os
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from . import database, models
+
+# Columns of the catalog files, in CSV order
+PRODUCT_COLUMNS = ("barcode", "name", "price")
+FORMATS = ("csv", "json", "ndjson")
+
+# EAN-8, UPC-A, EAN-13 and GTIN-14 carry a check digit; other codes are internal
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+def detect_format(filename, default="csv"):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return ext if ext in FORMATS else default
+
+def valid_check_digits(barcodes):
+    """
+    Boolean array: False for GTIN-length numeric barcodes whose check digit is
+    wrong. Computed per length over all the barcodes at once with numpy.
+    Barcodes of other lengths (in-store codes) are accepted as they are.
+    """
+    valid = np.ones(len(barcodes), dtype=bool)
+    lengths = np.fromiter((len(b) for b in barcodes), dtype=np.int64, count=len(barcodes))
+    valid[lengths == 0] = False
+
+    for length in GTIN_LENGTHS:
+        idx = np.flatnonzero(lengths == length)
+        if not idx.size:
+            continue
+        # One char -> one byte ('?' for non-ASCII), so rows keep their length
+        raw = "".join(barcodes[i] for i in idx).encode("ascii", "replace")
+        digits = np.frombuffer(raw, dtype=np.uint8).reshape(idx.size, length).astype(np.int16) - 48
+        numeric = ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+        # Weights 3, 1, 3, ... starting from the digit left of the check digit
+        weights = np.where(np.arange(length - 1)[::-1] % 2 == 0, 3, 1)
+        check = (10 - (digits[:, :-1] * weights).sum(axis=1) % 10) % 10
+        # Non-numeric codes of these lengths are internal codes too
+        valid[idx] = ~numeric | (check == digits[:, -1])
+    return valid
+
+def _iter_json_array(f, chunk_size=64 * 1024):
+    """Yields the objects of a JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    while True:
+        # Skip the opening bracket and separators
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in "[,"):
+            pos += 1
+        if pos < len(buffer):
+            if buffer[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+                yield obj
+                continue
+            except ValueError:
+                if eof:
+                    raise ValueError("Invalid JSON catalog")
+        elif eof:
+            return
+
+        # The next object is incomplete: keep its start and read more
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+def iter_products(f, fmt="csv"):
+    """
+    Yields (barcode, name, price) from a catalog file opened in binary or
+    text mode. CSV needs a barcode column (name and price are optional);
+    JSON is an array of objects and NDJSON one object per line.
+    """
+    if isinstance(f.read(0), bytes):
+        f = codecs.getreader("utf-8-sig")(f)
+
+    if fmt == "csv":
+        records = csv.DictReader(f)
+    elif fmt == "ndjson":
+        records = (json.loads(line) for line in f if line.strip())
+    elif fmt == "json":
+        records = _iter_json_array(f)
+    else:
+        raise ValueError(f"Unknown catalog format '{fmt}' (use one of {', '.join(FORMATS)})")
+
+    for record in records:
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        barcode = str(record.get("barcode") or "").strip()
+        name = record.get("name")
+        name = str(name).strip() or None if name is not None else None
+        price = record.get("price")
+        try:
+            price = float(price) if price not in (None, "") else None
+        except (TypeError, ValueError):
+            price = None
+        yield barcode, name, price
+
+def _upsert_statement(update_existing=True, columns=("name", "price")):
+    """INSERT ... ON CONFLICT that updates only `columns` of existing products."""
+    stmt = insert(models.Product)
+    if not update_existing or not columns:
+        return stmt.on_conflict_do_nothing(index_elements=[models.Product.barcode])
+    excluded = stmt.excluded
+    # Unchanged rows are left alone, so they do not bump the catalog version
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Product.barcode],
+        set_={column: excluded[column] for column in columns},
+        where=or_(*(getattr(models.Product, column).is_distinct_from(excluded[column])
+                    for column in columns)),
+    )
+
+def import_products(rows, session_factory=None, batch_size=5000, validate=True,
+                    update_existing=True, progress=None):
+    """
+    Upserts (barcode, name, price) rows into the products table, `batch_size`
+    rows per transaction with INSERT ... ON CONFLICT (existing products are
+    left untouched if not `update_existing`). Rows without a barcode, and with
+    `validate` those with a wrong EAN/UPC check digit, are skipped. A missing
+    name or price keeps the existing product's value; new products without a
+    price get 1.0. progress(stats) is called after every batch.
+    Returns the stats: read, imported, invalid and a few invalid samples.
+    """
+    session_factory = session_factory or database.SessionLocal
+    statements = {}  # Columns to update -> upsert statement
+    stats = {"read": 0, "imported": 0, "invalid": 0, "invalid_samples": []}
+
+    def flush(batch):
+        barcodes = [barcode for barcode, _, _ in batch]
+        ok = valid_check_digits(barcodes) if validate else [bool(b) for b in barcodes]
+        # Rows are grouped by the columns they actually have, one executemany per group
+        groups = {}
+        for (barcode, name, price), good in zip(batch, ok):
+            if good:
+                columns = ("name",) * (name is not None) + ("price",) * (price is not None)
+                groups.setdefault(columns, []).append(
+                    {"barcode": barcode, "name": name, "price": 1.0 if price is None else price})
+        accepted = sum(len(group) for group in groups.values())
+
+        rejected = len(batch) - accepted
+        if rejected:
+            stats["invalid"] += rejected
+            samples = stats["invalid_samples"]
+            samples.extend(b for b, good in zip(barcodes, ok) if not good and len(samples) < 10)
+            del samples[10:]
+
+        if groups:
+            db = session_factory()
+            try:
+                for columns, group in groups.items():
+                    if columns not in statements:
+                        statements[columns] = _upsert_statement(update_existing, columns)
+                    db.execute(statements[columns], group)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        stats["imported"] += accepted
+        if progress:
+            progress(stats)
+
+    batch = []
+    for row in rows:
+        stats["read"] += 1
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return stats
+
+def iter_product_rows(session_factory=None, chunk_size=1000):
+    """Yields lists of up to chunk_size (barcode, name, price) rows, by barcode."""
+    db = (session_factory or database.SessionLocal)()
+    try:
+        product = models.Product
+        result = db.execute(select(product.barcode, product.name, product.price)
+                            .order_by(product.barcode)
+                            .execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+def iter_products_csv(session_factory=None, chunk_size=1000):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(PRODUCT_COLUMNS)
+
+    for rows in iter_product_rows(session_factory, chunk_size):
+        writer.writerows(rows)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+    if output.tell():
+        yield output.getvalue()
+
+def iter_products_ndjson(session_factory=None, chunk_size=1000):
+    for rows in iter_product_rows(session_factory, chunk_size):
+        yield "".join(json.dumps(dict(zip(PRODUCT_COLUMNS, row)), ensure_ascii=False) + "\n"
+                      for row in rows)
+
+def iter_products_json(session_factory=None, chunk_size=1000):
+    yield "["
+    first = True
+    for rows in iter_product_rows(session_factory, chunk_size):
+        chunk = ",".join(json.dumps(dict(zip(PRODUCT_COLUMNS, row)), ensure_ascii=False) for row in rows)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
+
+EXPORTERS = {
+    "csv": (iter_products_csv, "text/csv"),
+    "json": (iter_products_json, "application/json"),
+    "ndjson": (iter_products_ndjson, "application/x-ndjson"),
+}
@@ -1,10 +1,71 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, func, null, or_, select, union_all
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 from . import models
+from .. import metrics
 from ..schemas import ScannedCodeCreate
 
 def get_codes(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.ScannedCode).order_by(models.ScannedCode.timestamp.desc()).offset(skip).limit(limit).all()
 
+def encode_cursor(code: models.ScannedCode) -> str:
+    raw = f"{code.timestamp.isoformat()}|{code.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Returns (timestamp, id). Raises ValueError for a malformed cursor."""
+    try:
+        timestamp, code_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(code_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, "codes_page")
+def get_codes_page(db: Session, cursor: str = None, limit: int = 100):
+    """
+    Keyset pagination, newest first: each page starts right after the last
+    row of the previous one, so deep pages cost the same as the first.
+    Returns (codes, next_cursor); next_cursor is None on the last page.
+    """
+    code = models.ScannedCode
+    query = db.query(code).order_by(code.timestamp.desc(), code.id.desc())
+    if cursor:
+        timestamp, code_id = decode_cursor(cursor)
+        query = query.filter(or_(code.timestamp < timestamp,
+                                 and_(code.timestamp == timestamp, code.id < code_id)))
+
+    # One extra row tells us whether there is a next page
+    codes = query.limit(limit + 1).all()
+    if len(codes) > limit:
+        return codes[:limit], encode_cursor(codes[limit - 1])
+    return codes, None
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, "code_summary")
+def get_code_summary(db: Session):
+    """
+    One row per barcode of the current list, aggregated in SQL:
+    [{"data", "type", "name", "price", "count"}], most recently scanned first.
+    Name, type and price are those of the first scan of each barcode.
+    """
+    code = models.ScannedCode
+    by_barcode = dict(partition_by=code.data)
+    ranked = select(code.data, code.type, code.product_name, code.price,
+                    func.row_number().over(order_by=(code.timestamp, code.id), **by_barcode).label("rank"),
+                    func.count().over(**by_barcode).label("count"),
+                    func.max(code.timestamp).over(**by_barcode).label("last_seen")).subquery()
+    rows = db.execute(
+        select(ranked.c.data, ranked.c.type, ranked.c.product_name, ranked.c.price, ranked.c.count)
+        .where(ranked.c.rank == 1)
+        .order_by(ranked.c.last_seen.desc())
+    )
+    return [
+        {"data": data, "type": type_, "name": name or data,
+         "price": price if price is not None else 0.0, "count": count}
+        for data, type_, name, price, count in rows
+    ]
+
 def create_code(db: Session, code: ScannedCodeCreate):
     db_code = models.ScannedCode(
         data=code.data, 
@@ -25,32 +86,76 @@ def delete_code(db: Session, code_id: int):
         return True
     return False
 
-def delete_all_codes(db: Session):
-    db.query(models.ScannedCode).delete()
-    db.commit()
+def delete_all_codes(db: Session, commit: bool = True):
+    """
+    Clears the current list (e.g. when a sale is closed). scan_stats_minute
+    is scan history and keeps these scans: the per-row delete trigger takes
+    them out, so they are added back afterwards.
+    """
+    code = models.ScannedCode
+    rollup = models.ScanStatsMinute
+    minute = func.strftime(models.MINUTE_FORMAT, code.timestamp)
+    current = db.execute(select(minute, func.count())
+                         .where(code.timestamp.isnot(None))
+                         .group_by(minute)).all()
+
+    # Emptying the aggregates first leaves the per-row delete triggers nothing to recompute
+    db.query(models.BarcodeAggregate).delete()
+    db.query(code).delete()
+
+    if current:
+        stmt = insert(rollup).values([{"minute": m, "scan_count": n} for m, n in current])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[rollup.minute],
+            set_={"scan_count": rollup.scan_count + stmt.excluded.scan_count}))
+    if commit:
+        db.commit()
 
 def get_barcode_metadata(db: Session, barcode: str):
     """Returns (name, price, total_count) for a given barcode."""
-    
-    # 1. Check Product Catalog first
-    product = get_product_by_barcode(db, barcode)
-    catalog_name = product.name if product else None
-    catalog_price = product.price if product else None
-
-    # 2. Check Scan History
-    last_entry = db.query(models.ScannedCode)\
-                   .filter(models.ScannedCode.data == barcode)\
-                   .order_by(models.ScannedCode.timestamp.desc())\
-                   .first()
-    
-    count = db.query(models.ScannedCode)\
-              .filter(models.ScannedCode.data == barcode)\
-              .count()
-    
-    # Prioritize catalog name, fallback to history
-    final_name = catalog_name if catalog_name else (last_entry.product_name if last_entry else None)
-    
-    return final_name, catalog_price, count
+    return get_barcode_metadata_batch(db, [barcode])[barcode]
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, "metadata_batch")
+def get_barcode_metadata_batch(db: Session, barcodes, catalog=None):
+    """
+    Returns {barcode: (name, price, total_count)} for many barcodes in a
+    single query. Counts and last names come from barcode_aggregates, so the
+    cost does not grow with the scan history. With an in-memory `catalog`
+    (CatalogIndex) the products table is not queried at all.
+    """
+    barcodes = list(dict.fromkeys(barcodes))
+    result = {barcode: (None, None, 0) for barcode in barcodes}
+    if not barcodes:
+        return result
+
+    product = models.Product
+    aggregate = models.BarcodeAggregate
+
+    if catalog is not None:
+        products = catalog.get_many(barcodes)
+        history = select(aggregate.barcode, aggregate.scan_count, aggregate.last_name)\
+                  .where(aggregate.barcode.in_(barcodes))
+        counts = {barcode: (count, last_name) for barcode, count, last_name in db.execute(history)}
+        for barcode in barcodes:
+            catalog_name, catalog_price = products.get(barcode, (None, None))
+            count, last_name = counts.get(barcode, (0, None))
+            result[barcode] = (catalog_name or last_name, catalog_price, count or 0)
+        return result
+
+    # Catalog products (with their history, if any) + history-only barcodes
+    in_catalog = select(product.barcode, product.name, product.price,
+                        aggregate.scan_count, aggregate.last_name)\
+                 .outerjoin(aggregate, aggregate.barcode == product.barcode)\
+                 .where(product.barcode.in_(barcodes))
+    history_only = select(aggregate.barcode, null(), null(),
+                          aggregate.scan_count, aggregate.last_name)\
+                   .where(aggregate.barcode.in_(barcodes))\
+                   .where(~exists().where(product.barcode == aggregate.barcode))
+
+    for barcode, catalog_name, catalog_price, count, last_name in db.execute(union_all(in_catalog, history_only)):
+        # Prioritize catalog name, fallback to history
+        result[barcode] = (catalog_name or last_name, catalog_price, count or 0)
+    return result
 
 def get_product_by_barcode(db: Session, barcode: str):
     return db.query(models.Product).filter(models.Product.barcode == barcode).first()
@@ -60,3 +165,74 @@ def create_product(db: Session, product: models.Product):
     db.commit()
     db.refresh(product)
     return product
+
+# Histogram buckets: SQLite strftime() format and step of each granularity
+GRANULARITIES = {
+    "minute": ("%Y-%m-%d %H:%M", timedelta(minutes=1)),
+    "hour": ("%Y-%m-%d %H:00", timedelta(hours=1)),
+    "day": ("%Y-%m-%d", timedelta(days=1)),
+    "week": ("%Y-%m-%d", timedelta(weeks=1)),   # Labelled by its Monday
+}
+MAX_BUCKETS = 10000
+
+def _bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+def _bucket_expr(column, granularity: str):
+    if granularity == "week":
+        # Monday on or before the date
+        return func.date(column, "-6 days", "weekday 1")
+    return func.strftime(GRANULARITIES[granularity][0], column)
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, "scan_histogram")
+def get_scan_histogram(db: Session, start: datetime, end: datetime, granularity: str = "hour",
+                       use_rollup: bool = True):
+    """
+    Scans per bucket in [start, end), counted by SQLite. Returns (labels,
+    counts) with empty buckets included. With use_rollup the per-minute
+    scan_stats_minute table is summed instead of scanning every row.
+    Raises ValueError for an unknown granularity or too many buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if end <= start:
+        raise ValueError("end must be after start")
+    label_format, step = GRANULARITIES[granularity]
+
+    first = _bucket_start(start, granularity)
+    if (end - first) / step > MAX_BUCKETS:
+        raise ValueError(f"Too many buckets (max {MAX_BUCKETS}), use a coarser granularity")
+
+    if use_rollup:
+        # Minute keys are 'YYYY-MM-DD HH:MM' text, so string ranges work.
+        # Ranges are rounded to whole minutes here.
+        rollup = models.ScanStatsMinute
+        bucket = _bucket_expr(rollup.minute, granularity)
+        query = select(bucket, func.sum(rollup.scan_count))\
+                .where(rollup.minute >= start.strftime(models.MINUTE_FORMAT))\
+                .where(rollup.minute < end.strftime(models.MINUTE_FORMAT))
+    else:
+        # Range predicate on the indexed timestamp (no LIKE, no full scan)
+        code = models.ScannedCode
+        bucket = _bucket_expr(code.timestamp, granularity)
+        query = select(bucket, func.count())\
+                .where(code.timestamp >= start)\
+                .where(code.timestamp < end)
+
+    counts = dict(db.execute(query.group_by(bucket)).all())
+
+    labels, data = [], []
+    moment = first
+    while moment < end:
+        label = moment.strftime(label_format)
+        labels.append(label)
+        data.append(int(counts.get(label, 0)))
+        moment += step
+    return labels, data
@@ -1,13 +1,35 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./barcodes.db"
 
-# connect_args={"check_same_thread": False} is needed for SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# WAL lets readers (list, exports, stats) run while scans are being written,
+# and synchronous=NORMAL only fsyncs at checkpoints instead of every commit
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,     # ms to wait for a lock instead of failing
+    "temp_store": "MEMORY",
+    "cache_size": -16000,     # KiB
+    "foreign_keys": "ON",
+}
+
+def make_engine(url=SQLALCHEMY_DATABASE_URL, pragmas=SQLITE_PRAGMAS):
+    # connect_args={"check_same_thread": False} is needed for SQLite
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    if pragmas:
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index, ForeignKey, text
 from datetime import datetime
 from .database import Base
 
@@ -12,6 +12,13 @@ class ScannedCode(Base):
     price = Column(Float, nullable=True)
     timestamp = Column(DateTime, default=datetime.now)
 
+    __table_args__ = (
+        # Latest scan of a barcode without sorting its whole history
+        Index("ix_scanned_codes_data_timestamp", "data", "timestamp"),
+        # Keyset pagination of the list (newest first)
+        Index("ix_scanned_codes_timestamp_id", "timestamp", "id"),
+    )
+
     def __repr__(self):
         return f"<ScannedCode(data={self.data}, type={self.type})>"
 
@@ -22,6 +29,224 @@ class Product(Base):
     barcode = Column(String, unique=True, index=True)
     name = Column(String)
     price = Column(Float, default=1.0)
+    # Value of catalog_state.version when the row last changed (set by triggers)
+    version = Column(Integer, nullable=False, default=0, server_default="0", index=True)
 
     def __repr__(self):
         return f"<Product(name={self.name}, barcode={self.barcode})>"
+
+class CatalogState(Base):
+    """
+    Single-row change counter of the products table, bumped by triggers, so
+    in-memory catalogs can fetch only what changed since the version they hold.
+    `deletions` counts removals (and barcode renames), which need a full reload.
+    """
+    __tablename__ = "catalog_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    deletions = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogState(version={self.version}, deletions={self.deletions})>"
+
+class ProductNameCache(Base):
+    __tablename__ = "product_name_cache"
+
+    barcode = Column(String, primary_key=True)
+    name = Column(String, nullable=True)   # NULL = looked up, nothing found (negative entry)
+    resolved_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<ProductNameCache(barcode={self.barcode}, name={self.name})>"
+
+class BarcodeAggregate(Base):
+    """
+    Per-barcode summary of scanned_codes, kept up to date by SQLite triggers
+    so every write path (ORM, bulk imports, raw SQL) maintains it.
+    """
+    __tablename__ = "barcode_aggregates"
+
+    barcode = Column(String, primary_key=True)
+    scan_count = Column(Integer, nullable=False, default=0)
+    last_name = Column(String, nullable=True)    # product_name of the latest scan
+    last_seen = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BarcodeAggregate(barcode={self.barcode}, scan_count={self.scan_count})>"
+
+class ScanStatsMinute(Base):
+    """
+    Scans per minute, rolled up by triggers; charts over long ranges read this.
+    It is scan history: clearing the current list (closing a sale) keeps it.
+    """
+    __tablename__ = "scan_stats_minute"
+
+    minute = Column(String, primary_key=True)    # 'YYYY-MM-DD HH:MM' (local time)
+    scan_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ScanStatsMinute(minute={self.minute}, scan_count={self.scan_count})>"
+
+MINUTE_FORMAT = "%Y-%m-%d %H:%M"
+
+class Sale(Base):
+    """One closed basket. The sales ledger is append-only: rows are never rewritten."""
+    __tablename__ = "sales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    closed_at = Column(DateTime, default=datetime.now, index=True)
+    item_count = Column(Integer, nullable=False, default=0)   # Units, not lines
+    total = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<Sale(id={self.id}, closed_at={self.closed_at}, total={self.total})>"
+
+class SaleItem(Base):
+    __tablename__ = "sale_items"
+
+    id = Column(Integer, primary_key=True)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
+    barcode = Column(String, nullable=False)
+    product_name = Column(String, nullable=True)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False, default=0.0)
+    total = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<SaleItem(sale_id={self.sale_id}, barcode={self.barcode}, quantity={self.quantity})>"
+
+_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_scanned_codes_insert AFTER INSERT ON scanned_codes
+    BEGIN
+        INSERT INTO barcode_aggregates (barcode, scan_count, last_name, last_seen)
+        VALUES (NEW.data, 1, NEW.product_name, NEW.timestamp)
+        ON CONFLICT(barcode) DO UPDATE SET
+            scan_count = scan_count + 1,
+            last_name = CASE WHEN last_seen IS NULL OR NEW.timestamp >= last_seen
+                             THEN NEW.product_name ELSE last_name END,
+            last_seen = CASE WHEN last_seen IS NULL OR NEW.timestamp >= last_seen
+                             THEN NEW.timestamp ELSE last_seen END;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_scanned_codes_delete AFTER DELETE ON scanned_codes
+    BEGIN
+        UPDATE barcode_aggregates SET
+            scan_count = scan_count - 1,
+            last_name = (SELECT product_name FROM scanned_codes WHERE data = OLD.data
+                         ORDER BY timestamp DESC LIMIT 1),
+            last_seen = (SELECT MAX(timestamp) FROM scanned_codes WHERE data = OLD.data)
+        WHERE barcode = OLD.data;
+        DELETE FROM barcode_aggregates WHERE barcode = OLD.data AND scan_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_scanned_codes_update AFTER UPDATE OF product_name, timestamp ON scanned_codes
+    BEGIN
+        UPDATE barcode_aggregates SET
+            last_name = (SELECT product_name FROM scanned_codes WHERE data = NEW.data
+                         ORDER BY timestamp DESC LIMIT 1),
+            last_seen = (SELECT MAX(timestamp) FROM scanned_codes WHERE data = NEW.data)
+        WHERE barcode = NEW.data;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scan_stats_insert AFTER INSERT ON scanned_codes
+    WHEN NEW.timestamp IS NOT NULL
+    BEGIN
+        INSERT INTO scan_stats_minute (minute, scan_count)
+        VALUES (strftime('{MINUTE_FORMAT}', NEW.timestamp), 1)
+        ON CONFLICT(minute) DO UPDATE SET scan_count = scan_count + 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scan_stats_delete AFTER DELETE ON scanned_codes
+    WHEN OLD.timestamp IS NOT NULL
+    BEGIN
+        UPDATE scan_stats_minute SET scan_count = scan_count - 1
+        WHERE minute = strftime('{MINUTE_FORMAT}', OLD.timestamp);
+        DELETE FROM scan_stats_minute
+        WHERE minute = strftime('{MINUTE_FORMAT}', OLD.timestamp) AND scan_count <= 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scan_stats_update AFTER UPDATE OF timestamp ON scanned_codes
+    WHEN OLD.timestamp IS NOT NULL AND NEW.timestamp IS NOT NULL
+    BEGIN
+        UPDATE scan_stats_minute SET scan_count = scan_count - 1
+        WHERE minute = strftime('{MINUTE_FORMAT}', OLD.timestamp);
+        DELETE FROM scan_stats_minute
+        WHERE minute = strftime('{MINUTE_FORMAT}', OLD.timestamp) AND scan_count <= 0;
+        INSERT INTO scan_stats_minute (minute, scan_count)
+        VALUES (strftime('{MINUTE_FORMAT}', NEW.timestamp), 1)
+        ON CONFLICT(minute) DO UPDATE SET scan_count = scan_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_insert AFTER INSERT ON products
+    BEGIN
+        UPDATE catalog_state SET version = version + 1 WHERE id = 1;
+        UPDATE products SET version = (SELECT version FROM catalog_state WHERE id = 1)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_update AFTER UPDATE OF barcode, name, price ON products
+    BEGIN
+        UPDATE catalog_state SET
+            version = version + 1,
+            deletions = deletions + (OLD.barcode IS NOT NEW.barcode)
+        WHERE id = 1;
+        UPDATE products SET version = (SELECT version FROM catalog_state WHERE id = 1)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_delete AFTER DELETE ON products
+    BEGIN
+        UPDATE catalog_state SET version = version + 1, deletions = deletions + 1 WHERE id = 1;
+    END
+    """,
+]
+
+def init_db(engine):
+    """
+    Creates missing tables, indexes and triggers. Safe to run on every start:
+    databases created before the aggregates/rollups existed are backfilled once.
+    """
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # create_all() does not add columns to existing tables
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(products)"))]
+        if "version" not in columns:
+            conn.execute(text("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+        for index in Product.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+        conn.execute(text("INSERT OR IGNORE INTO catalog_state (id, version, deletions) VALUES (1, 0, 0)"))
+
+        # create_all() skips indexes of tables that already exist
+        for index in ScannedCode.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+        for ddl in _TRIGGERS:
+            conn.execute(text(ddl))
+
+        empty = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM barcode_aggregates)")).scalar()
+        if empty:
+            conn.execute(text("""
+                INSERT INTO barcode_aggregates (barcode, scan_count, last_name, last_seen)
+                SELECT s.data, COUNT(*),
+                       (SELECT l.product_name FROM scanned_codes l WHERE l.data = s.data
+                        ORDER BY l.timestamp DESC LIMIT 1),
+                       MAX(s.timestamp)
+                FROM scanned_codes s GROUP BY s.data
+            """))
+
+        empty = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM scan_stats_minute)")).scalar()
+        if empty:
+            conn.execute(text(f"""
+                INSERT INTO scan_stats_minute (minute, scan_count)
+                SELECT strftime('{MINUTE_FORMAT}', timestamp), COUNT(*)
+                FROM scanned_codes WHERE timestamp IS NOT NULL GROUP BY 1
+            """))
@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import database, models
+from .. import metrics
+
+class ScanWriter:
+    """
+    Write-behind queue for scans. submit() returns at once with a Future;
+    a background thread writes everything queued (up to `max_batch` rows) in
+    one transaction. Scans arriving while a commit is running form the next
+    batch (group commit), so a burst costs a few commits instead of one per
+    row. `flush_interval` > 0 additionally waits that long for a batch to
+    fill, trading latency for fewer transactions.
+
+    Other writes that must not interleave with scan inserts (closing a sale)
+    run on the same thread through run().
+
+    Every Future is resolved only after its row is committed, and stop()
+    writes whatever is still queued, so acknowledged scans survive a restart
+    or a crash of the server. With WAL and synchronous=NORMAL they are not
+    fsynced at every commit, though: a power loss can still drop the last
+    ones acknowledged before it.
+    """
+    def __init__(self, session_factory=None, max_batch=200, flush_interval=0.0):
+        self.session_factory = session_factory or database.SessionLocal
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self.started = False
+        # Held while checking `started` and queueing, so stop() cannot slip in
+        # between and leave an item behind its end marker
+        self._lock = threading.Lock()
+        self.counters = {"rows": 0, "batches": 0, "errors": 0, "max_batch_seen": 0}
+
+    def start(self):
+        if self.started:
+            return self
+        self.started = True
+        self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, code):
+        """
+        Queues a ScannedCodeCreate. The Future resolves to the saved (detached)
+        ScannedCode, or raises the error that kept its row from being saved.
+        """
+        future = Future()
+        with self._lock:
+            queued = self.started
+            if queued:
+                self._queue.put((code, future))
+        if not queued:
+            # Not running (scripts, tests, after stop()): write through
+            self._write([(code, future)])
+        return future
+
+    def run(self, job):
+        """
+        Queues job(db) to run on the writer thread, after every scan queued
+        before it and before any queued after it. The job gets its own session
+        and must commit itself. The Future resolves to its return value.
+        """
+        future = Future()
+        with self._lock:
+            queued = self.started
+            if queued:
+                self._queue.put((job, future))
+        if not queued:
+            self._run_job(job, future)
+        return future
+
+    def flush(self, timeout=5.0):
+        """Blocks until everything submitted so far is committed."""
+        try:
+            self.run(lambda db: True).result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def _next_batch(self, first):
+        """Collects scans after `first`. Returns (batch, job item or None, stop)."""
+        batch = [first]
+        # Take what is already queued, waiting up to flush_interval for more
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, None, True
+            if callable(item[0]):
+                # Jobs are a batch boundary: scans before them are written first
+                return batch, item, False
+            batch.append(item)
+        return batch, None, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            job = None
+            if callable(item[0]):
+                job = item
+            else:
+                batch, job, stop = self._next_batch(item)
+                self._write(batch)
+
+            if job is not None:
+                self._run_job(*job)
+
+        # Drain whatever was queued before stop()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            if callable(item[0]):
+                self._run_job(*item)
+            else:
+                self._write([item])
+
+    def _run_job(self, job, future):
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            with metrics.DB_QUERY_SECONDS.time("writer_job"):
+                result = job(db)
+            future.set_result(result)
+        except Exception as e:
+            db.rollback()
+            self.counters["errors"] += 1
+            metrics.ERRORS.inc("writer")
+            print(f"[ERROR] Writer job failed: {e}")
+            future.set_exception(e)
+        finally:
+            db.close()
+
+    def _write(self, batch):
+        rows = [models.ScannedCode(data=code.data, type=code.type,
+                                   product_name=code.product_name, price=code.price)
+                for code, _ in batch]
+        error = None
+
+        # Keep the attributes loaded after commit: the rows leave the session
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            with metrics.DB_QUERY_SECONDS.time("insert_batch"):
+                db.add_all(rows)
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            error = e
+        finally:
+            db.close()
+
+        if error is not None and len(batch) > 1:
+            # One bad row must not fail the scans of every other lane in the batch
+            print(f"[ERROR] Saving {len(rows)} scans failed ({error}), retrying one by one")
+            for item in batch:
+                self._write([item])
+            return
+        if error is not None:
+            self.counters["errors"] += 1
+            metrics.ERRORS.inc("writer")
+            print(f"[ERROR] Saving scan {batch[0][0].data} failed: {error}")
+        else:
+            self.counters["rows"] += len(rows)
+            self.counters["batches"] += 1
+            self.counters["max_batch_seen"] = max(self.counters["max_batch_seen"], len(rows))
+
+        for (_, future), row in zip(batch, rows):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(row)
+
+    def stop(self, timeout=10.0):
+        if not self.started:
+            return
+        # Late submits write through; everything already queued is drained
+        with self._lock:
+            self.started = False
+            self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def get_stats(self):
+        return dict(self.counters, queued=self._queue.qsize())
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+class DedupStore:
+    """
+    Remembers which barcodes were accepted in the last `interval` seconds,
+    per source (lane), so the same code is not counted again while it stays
+    in front of the camera. Entries live in insertion order, which with a
+    single TTL is also expiry order: pruning pops from the front and stops at
+    the first live entry. `max_entries` caps memory regardless of traffic.
+
+    With `confirm_frames` > 1 a code must be read in that many frames, each
+    within `confirm_gap` seconds of the previous one, before it is accepted,
+    which filters one-off misreads.
+    """
+    def __init__(self, interval=5.0, max_entries=4096, confirm_frames=1, confirm_gap=1.0,
+                 per_source=True, clock=time.monotonic):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.confirm_frames = max(1, confirm_frames)
+        self.confirm_gap = confirm_gap
+        self.per_source = per_source
+        self.clock = clock
+
+        self._accepted = OrderedDict()  # (source, barcode) -> accepted at
+        self._pending = OrderedDict()   # (source, barcode) -> (frames seen, last seen)
+        self._lock = threading.Lock()
+        self.counters = {"accepted": 0, "duplicates": 0, "pending": 0, "expired": 0, "evicted": 0}
+
+    def _key(self, barcode, source):
+        return (source if self.per_source else None, barcode)
+
+    def _prune(self, now):
+        # Caller holds the lock. Both maps are ordered oldest first.
+        accepted = self._accepted
+        while accepted:
+            key, accepted_at = next(iter(accepted.items()))
+            if now - accepted_at < self.interval:
+                break
+            accepted.popitem(last=False)
+            self.counters["expired"] += 1
+        while len(accepted) > self.max_entries:
+            accepted.popitem(last=False)
+            self.counters["evicted"] += 1
+
+        pending = self._pending
+        while pending:
+            key, (_, last_seen) = next(iter(pending.items()))
+            if now - last_seen <= self.confirm_gap and len(pending) <= self.max_entries:
+                break
+            pending.popitem(last=False)
+
+    def check(self, barcode, source=None):
+        """
+        Registers one read of `barcode` and returns True if it counts as a new
+        scan, False if it is a duplicate or not confirmed yet.
+        """
+        key = self._key(barcode, source)
+        with self._lock:
+            now = self.clock()
+            self._prune(now)
+
+            if key in self._accepted:
+                self.counters["duplicates"] += 1
+                return False
+
+            if self.confirm_frames > 1:
+                frames, _ = self._pending.pop(key, (0, now))
+                frames += 1
+                if frames < self.confirm_frames:
+                    # Re-inserted at the end: the map stays ordered by last read
+                    self._pending[key] = (frames, now)
+                    self.counters["pending"] += 1
+                    return False
+
+            self._accepted[key] = now
+            self.counters["accepted"] += 1
+            if len(self._accepted) > self.max_entries:
+                self._accepted.popitem(last=False)
+                self.counters["evicted"] += 1
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._accepted)
+
+    def get_stats(self):
+        with self._lock:
+            self._prune(self.clock())
+            return dict(self.counters, entries=len(self._accepted), pending_entries=len(self._pending))
@@ -0,0 +1,119 @@
+import collections
+import itertools
+import json
+import threading
+
+class EventSubscriber:
+    """
+    One push client (e.g. a browser tab on /api/events). Events are kept in
+    a bounded queue: a client that stops reading loses its oldest events
+    instead of making the server buffer forever.
+    """
+    def __init__(self, bus, lanes=None, max_queue=256):
+        self.bus = bus
+        self.lanes = set(lanes) if lanes else None  # None = every lane
+        self._queue = collections.deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, event):
+        if self.lanes is not None and event["lane"] is not None and event["lane"] not in self.lanes:
+            return
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify()
+
+    def next_events(self, timeout=15.0):
+        """Waits for events and returns all the queued ones, or [] on timeout or close()."""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._queue)
+            self._queue.clear()
+        self.sent += len(events)
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        # Wakes up a next_events() still waiting for this client
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class EventBus:
+    """
+    Fans out server events (new scans, late product names, stats deltas) to
+    every subscriber, each with its own queue, so several tabs all see every
+    scan and no client has to poll.
+    """
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, lanes=None):
+        subscriber = EventSubscriber(self, lanes=lanes, max_queue=self.max_queue)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def reserve_id(self):
+        """Takes the id of an event published later, e.g. to put it in the event data."""
+        with self._lock:
+            return next(self._ids)
+
+    def publish(self, event_type, data, lane=None, event_id=None):
+        """
+        Queues the event for every subscriber and returns its id (a new one,
+        or `event_id` from reserve_id()). A copy of `data` is queued, so the
+        caller may keep changing its dict while subscribers serialize theirs.
+        """
+        with self._lock:
+            if event_id is None:
+                event_id = next(self._ids)
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        event = {"id": event_id, "event": event_type, "lane": lane, "data": dict(data)}
+        for subscriber in subscribers:
+            subscriber._push(event)
+        return event_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                "published": self.published,
+                "subscribers": [
+                    {"lanes": sorted(s.lanes) if s.lanes else None,
+                     "queued": len(s._queue), "sent": s.sent, "dropped": s.dropped}
+                    for s in self._subscribers
+                ],
+            }
+
+def format_sse(event):
+    """Serializes an event for a text/event-stream response."""
+    return (f"id: {event['id']}\n"
+            f"event: {event['event']}\n"
+            f"data: {json.dumps(event['data'], default=str)}\n\n")
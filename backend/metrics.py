@@ -0,0 +1,191 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds; covers a 50 µs SQLite lookup up to a 5 s remote API timeout
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label combination, e.g. errors_total{component="writer"}."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    """
+    Latency distribution per label combination. observe() is a bisect and a
+    few additions under a lock; the cumulative buckets are only built when
+    /metrics is scraped.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {_format_value(values[-1])}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+class Registry:
+    """
+    Metrics of the whole process, rendered in the Prometheus text format.
+    Collectors are callables run at scrape time that return
+    (name, kind, help, [(labels dict, value), ...]) tuples, for values the
+    components already keep themselves (get_stats()).
+    """
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                ERRORS.inc("metrics")
+                print(f"[ERROR] Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# Pipeline stages
+CAPTURE_SECONDS = registry.histogram(
+    "scanner_capture_seconds", "Time waiting for the camera to deliver a frame", ["lane"])
+CAPTURE_FAILURES = registry.counter(
+    "scanner_capture_failures_total", "Frames the camera failed to deliver", ["lane"])
+DECODE_STAGE_SECONDS = registry.histogram(
+    "scanner_decode_stage_seconds",
+    "Detector time per stage (grayscale, gate, preprocess, each decode pass, tracked, total)",
+    ["lane", "stage"])
+CODES = registry.counter(
+    "scanner_codes_total", "Decoded codes by outcome (new, duplicate, invalid)", ["result"])
+DB_QUERY_SECONDS = registry.histogram(
+    "scanner_db_query_seconds", "SQLite query and commit time", ["query"])
+NAME_LOOKUP_SECONDS = registry.histogram(
+    "scanner_name_lookup_seconds", "Remote product API request time", ["source", "outcome"])
+JPEG_ENCODE_SECONDS = registry.histogram(
+    "scanner_jpeg_encode_seconds", "Time to resize and JPEG-encode a stream frame", ["lane"])
+STREAM_SEND_SECONDS = registry.histogram(
+    "scanner_stream_send_seconds", "Time to hand one MJPEG frame to a /video_feed client", ["lane"])
+STREAM_FRAMES = registry.counter(
+    "scanner_stream_frames_total", "MJPEG frames sent to /video_feed clients", ["lane"])
+ERRORS = registry.counter(
+    "scanner_errors_total", "Errors caught and logged, by component", ["component"])
+
+def timed(histogram, *labels):
+    """Decorator: observes the run time of every call in `histogram`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+def observe_timings(lane_id, timings):
+    """Feeds a BarcodeDetector.last_timings dict into the per-stage histogram."""
+    for stage, seconds in timings.items():
+        DECODE_STAGE_SECONDS.observe(seconds, lane_id, stage)
+
+def stats_collector(name, get_stats, prefix="scanner"):
+    """
+    Collector exposing the numeric top-level values of a get_stats() dict as
+    gauges, e.g. scanner_writer{stat="rows"}.
+    """
+    def collect():
+        stats = get_stats()
+        samples = [({"stat": key}, value) for key, value in stats.items()
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        return [(f"{prefix}_{name}", "gauge", f"{name} statistics (see /api/stats/{name})", samples)]
+    return collect
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from backend.database import database, models
+
+class ProductNameCache:
+    """
+    Two-tier cache of names resolved by the remote product APIs:
+    an in-process LRU in front of a SQLite table that survives restarts.
+    "Not found" answers are cached too (negative entries), with their own,
+    shorter TTL so a product added upstream is picked up eventually.
+    """
+    MISS = object()
+
+    def __init__(self, session_factory=None, max_entries=1024, ttl=30 * 24 * 3600, negative_ttl=3600):
+        self.session_factory = session_factory or database.SessionLocal
+        self.max_entries = max_entries
+        self.ttl = timedelta(seconds=ttl)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+
+        self._lru = OrderedDict()  # barcode -> (name or None, resolved_at)
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def _is_fresh(self, name, resolved_at):
+        ttl = self.ttl if name is not None else self.negative_ttl
+        return datetime.now() - resolved_at < ttl
+
+    def _remember(self, barcode, name, resolved_at):
+        # Caller holds the lock
+        self._lru[barcode] = (name, resolved_at)
+        self._lru.move_to_end(barcode)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, barcode):
+        """Returns the cached name, None for a cached "not found", or ProductNameCache.MISS."""
+        with self._lock:
+            entry = self._lru.get(barcode)
+            if entry is not None:
+                if self._is_fresh(*entry):
+                    self._lru.move_to_end(barcode)
+                    self.counters["memory_hits"] += 1
+                    return entry[0]
+                del self._lru[barcode]
+                self.counters["expired"] += 1
+
+        db = self.session_factory()
+        try:
+            row = db.query(models.ProductNameCache).filter(models.ProductNameCache.barcode == barcode).first()
+            entry = (row.name, row.resolved_at) if row else None
+        finally:
+            db.close()
+
+        with self._lock:
+            if entry is not None and self._is_fresh(*entry):
+                self._remember(barcode, *entry)
+                self.counters["db_hits"] += 1
+                return entry[0]
+            if entry is not None:
+                self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return self.MISS
+
+    def put(self, barcode, name):
+        """Stores a resolved name (or None when no API knew the product) in both tiers."""
+        now = datetime.now()
+        with self._lock:
+            self._remember(barcode, name, now)
+
+        db = self.session_factory()
+        try:
+            db.merge(models.ProductNameCache(barcode=barcode, name=name, resolved_at=now))
+            db.commit()
+        finally:
+            db.close()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["db_hits"]
+            return {
+                **self.counters,
+                "size": len(self._lru),
+                "negative_entries": sum(1 for name, _ in self._lru.values() if name is None),
+                "max_entries": self.max_entries,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -15,31 +15,42 @@ class InvoicePDF(FPDF):
         self.cell(0, 10, f'Página {self.page_no()}/{{nb}}', align='C')
 
 class PDFGenerator:
-    def generate(self, codes):
-        pdf = InvoicePDF()
-        pdf.add_page()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        
-        # Date and Time
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        pdf.set_font('Helvetica', '', 10)
-        pdf.cell(0, 10, f'Fecha de generación: {now}', new_x="LMARGIN", new_y="NEXT")
-        pdf.ln(5)
-        
-        # Aggregation Logic
+    @staticmethod
+    def group_codes(codes):
+        """Groups ScannedCode rows into the items of crud.get_code_summary()."""
         # Group by data (barcode) or product_name if barcode is missing (fallback)
         grouped_items = defaultdict(lambda: {'count': 0, 'price': 0, 'name': 'Unknown', 'type': ''})
-        
+
         for code in codes:
             key = code.data
             name = code.product_name if code.product_name else code.data
             price = code.price if code.price is not None else 0.0
-            
+
             grouped_items[key]['count'] += 1
             grouped_items[key]['price'] = price # Assuming price is constant per item type
             grouped_items[key]['name'] = name
             grouped_items[key]['type'] = code.type
 
+        return [dict(item, data=key) for key, item in grouped_items.items()]
+
+    def generate(self, codes=None, items=None):
+        """
+        Renders the invoice from ScannedCode rows, or from already aggregated
+        items (one per barcode, see crud.get_code_summary).
+        """
+        if items is None:
+            items = self.group_codes(codes or [])
+
+        pdf = InvoicePDF()
+        pdf.add_page()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        
+        # Date and Time
+        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        pdf.set_font('Helvetica', '', 10)
+        pdf.cell(0, 10, f'Fecha de generación: {now}', new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(5)
+        
         # Table Header
         pdf.set_font('Helvetica', 'B', 10)
         pdf.set_fill_color(240, 240, 240)
@@ -56,7 +67,7 @@ class PDFGenerator:
         pdf.set_font('Helvetica', '', 10)
         grand_total = 0.0
         
-        for key, item in grouped_items.items():
+        for item in items:
             count = item['count']
             unit_price = item['price']
             total_price = count * unit_price
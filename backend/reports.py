@@ -0,0 +1,75 @@
+import os
+import queue
+import threading
+
+from backend import metrics
+from backend.pdf_generator import PDFGenerator
+from backend.sales_tracker import SalesTracker
+
+class ReportWorker:
+    """
+    Builds the documents of closed sales (PDF receipt) in a background
+    thread, so closing a sale never waits for fpdf. Reports land in
+    `output_dir` as sale_<id>.pdf.
+    """
+    def __init__(self, sales_tracker=None, output_dir="reports"):
+        self.sales_tracker = sales_tracker or SalesTracker()
+        self.output_dir = output_dir
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self.started = False
+        self.counters = {"done": 0, "errors": 0}
+
+    def start(self):
+        if self.started:
+            return self
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.started = True
+        self._thread = threading.Thread(target=self._run, name="report-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, sale_id):
+        self._queue.put(sale_id)
+
+    def pdf_path(self, sale_id):
+        return os.path.join(self.output_dir, f"sale_{sale_id}.pdf")
+
+    def _run(self):
+        while True:
+            sale_id = self._queue.get()
+            if sale_id is None:
+                break
+            try:
+                self.build_pdf(sale_id)
+                self.counters["done"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                metrics.ERRORS.inc("reports")
+                print(f"[ERROR] Report for sale {sale_id} failed: {e}")
+
+    def build_pdf(self, sale_id):
+        """Writes the receipt of a sale. Returns its path, or None if the sale does not exist."""
+        items = self.sales_tracker.get_items(sale_id)
+        if items is None:
+            return None
+
+        path = self.pdf_path(sale_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(bytes(PDFGenerator().generate(items=items)))
+        # Readers never see a half-written file
+        os.replace(tmp_path, path)
+        return path
+
+    def stop(self, timeout=10.0):
+        if not self.started:
+            return
+        # Reports already queued are still written
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        self.started = False
+
+    def get_stats(self):
+        return dict(self.counters, queued=self._queue.qsize())
@@ -0,0 +1,169 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend import metrics
+
+DEFAULT_BASE_URLS = {
+    "food": "https://world.openfoodfacts.org",
+    "beauty": "https://world.openbeautyfacts.org",
+    "products": "https://world.openproductfacts.org",
+    "books": "https://openlibrary.org",
+}
+
+class NameResolver:
+    """
+    Resolves product names from the Open Food/Product/Beauty Facts and Open
+    Library APIs off the video path. All sources are queried at the same
+    time through one pooled HTTP session and the first valid answer wins,
+    so an unknown code costs one timeout instead of four in a row.
+
+    A lookup gives the name, None when the sources answered that they don't
+    know the code, or FAILED when none of them answered (timeouts, connection
+    errors, server errors), which must not be cached as "not found".
+    """
+    FAILED = object()
+
+    def __init__(self, base_urls: Optional[Dict[str, str]] = None, timeout: float = 2.0, max_workers: int = 8):
+        self.base_urls = dict(DEFAULT_BASE_URLS, **(base_urls or {}))
+        self.timeout = timeout
+
+        # Keep-alive connections are reused across lookups
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.base_urls), pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="name-resolver")
+        self._lock = threading.Lock()
+        self._pending = {}  # barcode -> list of callbacks waiting for the same lookup
+
+    def _fetch_from_off_family(self, barcode: str, api_type: str = "food"):
+        """
+        Helper for OFF family APIs (food, beauty, products).
+        api_type can be 'food', 'beauty', or 'products'.
+        Returns the name, None if the API does not know the code, or FAILED.
+        """
+        url = f"{self.base_urls[api_type]}/api/v0/product/{barcode}.json"
+
+        start, outcome = time.perf_counter(), "not_found"
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") == 1:
+                    product = data.get("product", {})
+                    name = product.get("product_name") or product.get("generic_name")
+                    if name:
+                        outcome = "found"
+                        return name
+            elif response.status_code != 404:
+                outcome = "error"
+                return self.FAILED
+            return None
+        except Exception:
+            outcome = "error"
+            return self.FAILED
+        finally:
+            metrics.NAME_LOOKUP_SECONDS.observe(time.perf_counter() - start, api_type, outcome)
+
+    def _fetch_from_open_library(self, barcode: str):
+        """
+        Fetches book title from Open Library API.
+        Works best for EAN-13 starting with 978/979.
+        Returns the title, None if it is not a known book, or FAILED.
+        """
+        url = f"{self.base_urls['books']}/api/books?bibkeys=ISBN:{barcode}&format=json&jscmd=data"
+        start, outcome = time.perf_counter(), "not_found"
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                key = f"ISBN:{barcode}"
+                if key in data:
+                    title = data[key].get("title")
+                    if title:
+                        outcome = "found"
+                        return f"Book: {title}"
+            elif response.status_code != 404:
+                outcome = "error"
+                return self.FAILED
+            return None
+        except Exception:
+            outcome = "error"
+            return self.FAILED
+        finally:
+            metrics.NAME_LOOKUP_SECONDS.observe(time.perf_counter() - start, "books", outcome)
+
+    def _sources(self, barcode: str):
+        sources = []
+        # Open Library only knows books: ISBN-13 usually starts with 978 or 979
+        if barcode.startswith(("978", "979")) and len(barcode) == 13:
+            sources.append(self._fetch_from_open_library)
+        sources.append(lambda b: self._fetch_from_off_family(b, "food"))
+        sources.append(lambda b: self._fetch_from_off_family(b, "products"))
+        sources.append(lambda b: self._fetch_from_off_family(b, "beauty"))
+        return sources
+
+    def resolve_async(self, barcode: str, callback: Callable[[str, Optional[str]], None]):
+        """
+        Starts a lookup and returns immediately. callback(barcode, name) is
+        called exactly once from a worker thread with the first valid name,
+        None if no source knows the code, or FAILED if no source answered.
+        Concurrent requests for the same barcode share a single lookup.
+        """
+        with self._lock:
+            if barcode in self._pending:
+                self._pending[barcode].append(callback)
+                return
+            self._pending[barcode] = [callback]
+
+        sources = self._sources(barcode)
+        state = {"remaining": len(sources), "answered": False, "done": False}
+        state_lock = threading.Lock()
+
+        def on_source_done(future):
+            result = future.result() if not future.cancelled() else self.FAILED
+            name = result if result is not self.FAILED else None
+            with state_lock:
+                state["remaining"] -= 1
+                state["answered"] = state["answered"] or result is not self.FAILED
+                if state["done"] or (not name and state["remaining"] > 0):
+                    return
+                state["done"] = True
+                answered = state["answered"]
+            self._finish(barcode, (name or None) if answered else self.FAILED)
+
+        for fetch in sources:
+            self._executor.submit(fetch, barcode).add_done_callback(on_source_done)
+
+    def _finish(self, barcode, name):
+        with self._lock:
+            callbacks = self._pending.pop(barcode, [])
+        for callback in callbacks:
+            try:
+                callback(barcode, name)
+            except Exception as e:
+                metrics.ERRORS.inc("resolver")
+                print(f"[ERROR] Name resolution callback failed for {barcode}: {e}")
+
+    def resolve(self, barcode: str, timeout: Optional[float] = None):
+        """Blocking version of resolve_async (FAILED as well if it times out)."""
+        done = threading.Event()
+        result = {}
+
+        def callback(_, name):
+            result["name"] = name
+            done.set()
+
+        self.resolve_async(barcode, callback)
+        done.wait(timeout if timeout is not None else self.timeout + 1.0)
+        return result.get("name", self.FAILED)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
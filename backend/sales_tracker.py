@@ -3,34 +3,26 @@ import openpyxl
 from openpyxl import Workbook
 from datetime import datetime
 from collections import defaultdict
+from sqlalchemy import select
 
-class SalesTracker:
-    def __init__(self, filename="sales.xlsx"):
-        self.filename = filename
-
-    def _ensure_file_exists(self):
-        if not os.path.exists(self.filename):
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Ventas"
-            headers = ["Fecha y Hora", "Código de Barras", "Producto", "Cantidad", "Precio Unitario", "Total"]
-            ws.append(headers)
-            wb.save(self.filename)
+from backend.database import crud, database, models
 
-    def log_sale(self, codes):
-        """
-        Aggregates scanned codes and appends them to the Excel file.
-        """
-        if not codes:
-            return
+HEADERS = ["Fecha y Hora", "Código de Barras", "Producto", "Cantidad", "Precio Unitario", "Total"]
+DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
 
-        self._ensure_file_exists()
-        wb = openpyxl.load_workbook(self.filename)
-        ws = wb.active
-
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+class SalesTracker:
+    """
+    Sales ledger. Every closed basket is appended to the `sales` and
+    `sale_items` tables, so closing a sale costs the same no matter how long
+    the history is. The Excel workbook is generated on demand for a date
+    range (export_xlsx) instead of being rewritten on every sale.
+    """
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or database.SessionLocal
 
-        # Aggregate items
+    @staticmethod
+    def aggregate_codes(codes):
+        """Groups ScannedCode rows into [{"barcode", "name", "quantity", "unit_price"}]."""
         aggregated = defaultdict(lambda: {"count": 0, "name": "Unknown", "price": 0.0})
         for code in codes:
             key = code.data
@@ -38,13 +30,164 @@ class SalesTracker:
             aggregated[key]["name"] = code.product_name or code.data
             aggregated[key]["price"] = code.price if code.price is not None else 0.0
 
-        for barcode, item in aggregated.items():
-            qty = item["count"]
-            unit_price = item["price"]
-            total = qty * unit_price
-            
-            row = [now, barcode, item["name"], qty, unit_price, total]
+        return [{"barcode": barcode, "name": item["name"], "quantity": item["count"],
+                 "unit_price": item["price"]}
+                for barcode, item in aggregated.items()]
+
+    @staticmethod
+    def add_sale(db, items, closed_at=None):
+        """
+        Adds a sale and its lines to the session without committing, so the
+        caller can make it part of a larger transaction. Returns the Sale.
+        """
+        sale = models.Sale(closed_at=closed_at or datetime.now())
+        db.add(sale)
+        db.flush()  # Assigns sale.id
+        SalesTracker._add_lines(db, sale, items)
+        return sale
+
+    @staticmethod
+    def _add_lines(db, sale, items):
+        lines = []
+        for item in items:
+            total = item["quantity"] * item["unit_price"]
+            lines.append(models.SaleItem(sale_id=sale.id, barcode=item["barcode"],
+                                         product_name=item["name"], quantity=item["quantity"],
+                                         unit_price=item["unit_price"], total=total))
+        db.add_all(lines)
+
+        sale.item_count = sum(line.quantity for line in lines)
+        sale.total = sum(line.total for line in lines)
+
+    def close_sale(self, db):
+        """
+        Moves the current basket (every scanned code) into the ledger and
+        empties it, in one transaction: either the sale is recorded and the
+        basket cleared, or nothing changes. Returns the Sale, or None if the
+        basket was empty.
+        """
+        try:
+            # Writing first takes SQLite's write lock, so no scan can be
+            # committed between the snapshot below and the delete
+            sale = models.Sale(closed_at=datetime.now())
+            db.add(sale)
+            db.flush()
+
+            summary = crud.get_code_summary(db)
+            if not summary:
+                db.rollback()
+                return None
+
+            items = [{"barcode": row["data"], "name": row["name"], "quantity": row["count"],
+                      "unit_price": row["price"]} for row in summary]
+            self._add_lines(db, sale, items)
+            crud.delete_all_codes(db, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        print(f"[INFO] Sale {sale.id} closed ({sale.item_count} items, total {sale.total:.2f})")
+        return sale
+
+    def get_items(self, sale_id):
+        """Lines of a sale as PDFGenerator items, or None if the sale does not exist."""
+        db = self.session_factory()
+        try:
+            if db.get(models.Sale, sale_id) is None:
+                return None
+            lines = db.query(models.SaleItem).filter(models.SaleItem.sale_id == sale_id)\
+                      .order_by(models.SaleItem.id).all()
+            return [{"data": line.barcode, "name": line.product_name or line.barcode,
+                     "count": line.quantity, "price": line.unit_price} for line in lines]
+        finally:
+            db.close()
+
+    def log_sale(self, codes):
+        """
+        Aggregates scanned codes and appends them to the sales ledger.
+        Returns the id of the new sale, or None if there was nothing to log.
+        """
+        if not codes:
+            return None
+
+        db = self.session_factory()
+        try:
+            sale = self.add_sale(db, self.aggregate_codes(codes))
+            db.commit()
+            print(f"[INFO] Sale {sale.id} recorded ({sale.item_count} items)")
+            return sale.id
+        finally:
+            db.close()
+
+    def iter_rows(self, start=None, end=None, chunk_size=1000):
+        """Yields the ledger lines in [start, end) as worksheet rows, oldest first."""
+        sale, item = models.Sale, models.SaleItem
+        query = select(sale.closed_at, item.barcode, item.product_name, item.quantity,
+                       item.unit_price, item.total)\
+                .join(sale, sale.id == item.sale_id)\
+                .order_by(sale.closed_at, item.id)
+        if start is not None:
+            query = query.where(sale.closed_at >= start)
+        if end is not None:
+            query = query.where(sale.closed_at < end)
+
+        db = self.session_factory()
+        try:
+            for rows in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+                for closed_at, barcode, name, quantity, unit_price, total in rows:
+                    yield [closed_at.strftime(DATE_FORMAT), barcode, name, quantity, unit_price, total]
+        finally:
+            db.close()
+
+    def export_xlsx(self, target, start=None, end=None):
+        """
+        Writes the sales of [start, end) to `target` (path or binary file) in
+        the same layout as the old sales.xlsx. Uses openpyxl's write-only mode,
+        so rows are streamed to disk instead of held in memory.
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Ventas")
+        ws.append(HEADERS)
+        for row in self.iter_rows(start, end):
             ws.append(row)
+        wb.save(target)
+
+    def import_workbook(self, filename="sales.xlsx"):
+        """
+        One-time import of a workbook written by the old tracker. Rows with
+        the same date and time become one sale. Returns the number of sales.
+        """
+        if not os.path.exists(filename):
+            return 0
+
+        sales = defaultdict(list)
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        try:
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if not row or not row[0]:
+                    continue
+                when, barcode, name, quantity, unit_price = row[:5]
+                sales[when].append({"barcode": str(barcode), "name": name,
+                                    "quantity": int(quantity or 0), "unit_price": float(unit_price or 0.0)})
+        finally:
+            wb.close()
+
+        db = self.session_factory()
+        try:
+            for when, items in sales.items():
+                closed_at = when if isinstance(when, datetime) else datetime.strptime(str(when), DATE_FORMAT)
+                self.add_sale(db, items, closed_at=closed_at)
+            db.commit()
+        finally:
+            db.close()
+
+        print(f"[INFO] Imported {len(sales)} sales from {filename}")
+        return len(sales)
 
-        wb.save(self.filename)
-        print(f"[INFO] Sales recorded in {self.filename}")
+    def has_sales(self):
+        db = self.session_factory()
+        try:
+            return db.query(models.Sale.id).first() is not None
+        finally:
+            db.close()
@@ -19,6 +19,7 @@ class ScannedCodeBase(BaseModel):
 class ScannedCodeCreate(ScannedCodeBase):
     product_name: Optional[str] = None
     price: Optional[float] = None
+    scan_id: Optional[int] = None  # Id of the pushed scan event, makes saving it idempotent
 
 class ScannedCodeResponse(ScannedCodeBase):
     id: Optional[int] = None
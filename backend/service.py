@@ -1,90 +1,71 @@
 from typing import List, Optional
 from backend.schemas import ScannedCodeCreate
-import time
-import requests
+from backend.name_cache import ProductNameCache
+from backend.resolver import NameResolver
+from backend.dedup import DedupStore
+from backend import metrics
 
 class BarcodeService:
-    def __init__(self):
-        # In-memory deduplication buffer
-        # Key: barcode_data, Value: timestamp of last scan
-        self._last_scanned = {} 
-        self._dedup_interval = 5.0 # Seconds to ignore duplicates
+    def __init__(self, name_cache: Optional[ProductNameCache] = None,
+                 resolver: Optional[NameResolver] = None, on_name_resolved=None,
+                 dedup: Optional[DedupStore] = None):
+        # In-memory deduplication buffer, bounded and keyed by lane
+        self.dedup = dedup or DedupStore(interval=5.0) # Seconds to ignore duplicates
 
-    def _fetch_from_off_family(self, barcode: str, api_type: str = "food") -> Optional[str]:
-        """
-        Helper for OFF family APIs (food, beauty, products).
-        api_type can be 'food', 'beauty', or 'products'.
-        """
-        subdomain = {
-            "food": "world",
-            "beauty": "world",
-            "products": "world"
-        }.get(api_type, "world")
-        
-        # OFF URLs differ slightly by type
-        base_urls = {
-            "food": "https://world.openfoodfacts.org",
-            "beauty": "https://world.openbeautyfacts.org",
-            "products": "https://world.openproductfacts.org"
-        }
-        
-        url = f"{base_urls.get(api_type)}/api/v0/product/{barcode}.json"
-        
-        try:
-            response = requests.get(url, timeout=2) # Short timeout to keep fallback snappy
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == 1:
-                    product = data.get("product", {})
-                    name = product.get("product_name") or product.get("generic_name")
-                    if name: return name
-            return None
-        except:
-            return None
-
-    def _fetch_from_open_library(self, barcode: str) -> Optional[str]:
-        """
-        Fetches book title from Open Library API.
-        Works best for EAN-13 starting with 978/979.
-        """
-        url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{barcode}&format=json&jscmd=data"
-        try:
-            response = requests.get(url, timeout=2)
-            if response.status_code == 200:
-                data = response.json()
-                key = f"ISBN:{barcode}"
-                if key in data:
-                    return data[key].get("title")
-            return None
-        except:
-            return None
+        # Remembers what the remote APIs answered (including "not found")
+        self.name_cache = name_cache
 
-    def get_product_name(self, barcode: str, db_name: Optional[str] = None) -> str:
+        # Remote lookups run in the background; on_name_resolved(code, name)
+        # is called from a resolver thread once the name is known
+        self.resolver = resolver or NameResolver()
+        self.on_name_resolved = on_name_resolved
+
+    def _known_name(self, barcode: str, db_name: Optional[str] = None):
         """
-        Tries local memory first, then multiple APIs.
+        Name from local memory or the name cache, without any HTTP request.
+        Returns ProductNameCache.MISS when the remote APIs must be asked.
         """
         # 1. Local Memory (Check if we already named it)
         if db_name and db_name != "Product Unknown":
             return db_name
 
-        # 2. Check if it's likely a book (ISBN-13 usually starts with 978 or 979)
-        if barcode.startswith(("978", "979")) and len(barcode) == 13:
-            book_title = self._fetch_from_open_library(barcode)
-            if book_title: return f"Book: {book_title}"
+        # 2. Name cache: no HTTP at all for codes already looked up (found or not)
+        if self.name_cache is not None:
+            cached = self.name_cache.get(barcode)
+            if cached is not ProductNameCache.MISS:
+                return cached or "Product Unknown"
 
-        # 3. Try Open Food Facts
-        name = self._fetch_from_off_family(barcode, "food")
-        if name: return name
+        return ProductNameCache.MISS
 
-        # 4. Try Open Product Facts
-        name = self._fetch_from_off_family(barcode, "products")
-        if name: return name
+    def get_product_name(self, barcode: str, db_name: Optional[str] = None) -> str:
+        """
+        Tries local memory first, then the name cache, then multiple APIs (blocking).
+        """
+        name = self._known_name(barcode, db_name)
+        if name is not ProductNameCache.MISS:
+            return name
 
-        # 5. Try Open Beauty Facts
-        name = self._fetch_from_off_family(barcode, "beauty")
-        if name: return name
+        # 3. Remote APIs, all queried at once
+        name = self.resolver.resolve(barcode)
+        if name is NameResolver.FAILED:
+            # Network trouble is not a "not found": asked again on the next scan
+            return "Product Unknown"
+        if self.name_cache is not None:
+            self.name_cache.put(barcode, name)
 
-        return "Product Unknown"
+        return name or "Product Unknown"
+
+    def resolve_name_async(self, code: dict):
+        """Looks the name up in the background and reports it through on_name_resolved."""
+        def done(barcode, name):
+            if name is NameResolver.FAILED:
+                name = None  # Not cached, so the next scan asks again
+            elif self.name_cache is not None:
+                self.name_cache.put(barcode, name)
+            if self.on_name_resolved:
+                self.on_name_resolved(code, name or "Product Unknown")
+
+        self.resolver.resolve_async(code['data'], done)
 
     def validate_code(self, code_data: str) -> bool:
         # Additional business rules can go here
@@ -92,35 +73,63 @@ class BarcodeService:
             return False
         return True
 
-    def is_duplicate(self, code_data: str) -> bool:
-        now = time.time()
-        last_time = self._last_scanned.get(code_data)
-        if last_time and (now - last_time < self._dedup_interval):
-            return True
-        self._last_scanned[code_data] = now
-        return False
+    def is_duplicate(self, code_data: str, source=None) -> bool:
+        return not self.dedup.check(code_data, source)
 
-    def process_frame_codes(self, raw_codes: List[dict], db_metadata_func=None) -> List[dict]:
+    def process_frame_codes(self, raw_codes: List[dict], db_metadata_func=None,
+                            db_metadata_batch_func=None) -> List[dict]:
         """
         Filters raw codes and attaches product info + scan counts.
+        db_metadata_batch_func(barcodes) -> {barcode: (name, price, count)} looks
+        up all the new codes of the frame at once; db_metadata_func(barcode)
+        does it one by one.
         """
         valid_codes = []
+        new_codes = []
+        in_frame = set()
         for code in raw_codes:
             data = code['data']
             if self.validate_code(data):
-                if not self.is_duplicate(data):
+                # A code read twice in one frame is still one frame for the dedup
+                first_read = data not in in_frame
+                in_frame.add(data)
+                if first_read and not self.is_duplicate(data, code.get('lane')):
                     code['is_new'] = True
-                    
-                    last_name, price, count = (None, None, 0)
-                    if db_metadata_func:
-                        last_name, price, count = db_metadata_func(data)
-                    
-                    code['product_name'] = self.get_product_name(data, db_name=last_name)
-                    code['price'] = price
-                    code['scan_count'] = count + 1 # Include current scan
+                    new_codes.append(code)
                 else:
                     code['is_new'] = False
                     code['product_name'] = None
                     code['scan_count'] = 0
                 valid_codes.append(code)
+
+        for result, count in (("new", len(new_codes)), ("duplicate", len(valid_codes) - len(new_codes)),
+                              ("invalid", len(raw_codes) - len(valid_codes))):
+            if count:
+                metrics.CODES.inc(result, amount=count)
+
+        # Duplicates never touch the database
+        metadata = {}
+        if new_codes and db_metadata_batch_func:
+            metadata = db_metadata_batch_func([c['data'] for c in new_codes])
+
+        for code in new_codes:
+            data = code['data']
+            last_name, price, count = (None, None, 0)
+            if data in metadata:
+                last_name, price, count = metadata[data]
+            elif db_metadata_func:
+                last_name, price, count = db_metadata_func(data)
+
+            code['price'] = price
+            code['scan_count'] = count + 1 # Include current scan
+
+            name = self._known_name(data, db_name=last_name)
+            if name is ProductNameCache.MISS:
+                # Report the scan now, the name follows when the APIs answer
+                code['product_name'] = None
+                code['resolving'] = True
+                self.resolve_name_async(dict(code))
+            else:
+                code['product_name'] = name
+                code['resolving'] = False
         return valid_codes
@@ -0,0 +1,148 @@
+import cv2
+import numpy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Detector of each worker process (created once by _init_worker)
+_detector = None
+
+def _init_worker(use_gate, budget_ms):
+    from backend.vision.detector import BarcodeDetector
+    global _detector
+    _detector = BarcodeDetector(budget_ms=budget_ms, use_gate=use_gate)
+
+def _decode_frame(detector, source, frame):
+    _, codes = detector.detect(frame, annotate=False)
+    return {"source": source, "codes": codes, "timings": dict(detector.last_timings)}
+
+def _decode_images(paths):
+    results = []
+    for path in paths:
+        t0 = time.perf_counter()
+        frame = cv2.imread(path)
+        load = time.perf_counter() - t0
+        if frame is None:
+            print(f"[WARN] Could not read image: {path}")
+            continue
+        result = _decode_frame(_detector, os.path.basename(path), frame)
+        result["timings"]["load"] = load
+        results.append(result)
+    return results
+
+def _decode_video_range(path, start, end):
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    results = []
+    for index in range(start, end):
+        t0 = time.perf_counter()
+        grabbed, frame = cap.read()
+        load = time.perf_counter() - t0
+        if not grabbed:
+            break
+        result = _decode_frame(_detector, f"{os.path.basename(path)}#{index}", frame)
+        result["timings"]["load"] = load
+        results.append(result)
+    cap.release()
+    return results
+
+def _is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+def _plan_tasks(path, workers):
+    """Splits the input into (function, args) chunks: lists of images or frame ranges of a video."""
+    if os.path.isdir(path):
+        images = sorted(os.path.join(path, f) for f in os.listdir(path) if _is_image(f))
+        chunk = max(1, len(images) // (max(workers, 1) * 4))
+        return [(_decode_images, (images[i:i + chunk],)) for i in range(0, len(images), chunk)]
+
+    if _is_image(path):
+        return [(_decode_images, ([path],))]
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    # Keep frame order when running sequentially (the gate compares consecutive frames)
+    if workers <= 1 or total <= 0:
+        return [(_decode_video_range, (path, 0, total if total > 0 else 10**9))]
+    chunk = -(-total // workers)
+    return [(_decode_video_range, (path, i, min(total, i + chunk))) for i in range(0, total, chunk)]
+
+class BatchReport:
+    """Throughput, hit rate and per-stage latency percentiles of a batch run."""
+    def __init__(self, results, elapsed, workers):
+        self.results = results
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def frames(self):
+        return len(self.results)
+
+    @property
+    def fps(self):
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def hit_rate(self):
+        hits = sum(1 for r in self.results if r["codes"])
+        return hits / self.frames if self.frames else 0.0
+
+    def unique_codes(self):
+        return sorted({c["data"] for r in self.results for c in r["codes"]})
+
+    def stage_percentiles(self, percentiles=(50, 90, 99)):
+        """Stage -> {"count", "p50", ...} in milliseconds, over the frames where the stage ran."""
+        samples = {}
+        for r in self.results:
+            for stage, seconds in r["timings"].items():
+                samples.setdefault(stage, []).append(seconds * 1000)
+
+        report = {}
+        for stage, values in samples.items():
+            values = numpy.array(values)
+            report[stage] = {"count": len(values)}
+            for p in percentiles:
+                report[stage][f"p{p}"] = round(float(numpy.percentile(values, p)), 3)
+        return report
+
+    def as_dict(self):
+        return {
+            "frames": self.frames,
+            "workers": self.workers,
+            "elapsed_s": round(self.elapsed, 3),
+            "fps": round(self.fps, 2),
+            "hit_rate": round(self.hit_rate, 4),
+            "unique_codes": self.unique_codes(),
+            "stages_ms": self.stage_percentiles(),
+        }
+
+def decode_batch(path, workers=0, use_gate=False, budget_ms=40.0):
+    """
+    Decodes a folder of images, a single image or a video file.
+    workers=0 runs in this process; N > 0 spreads the work over N processes.
+    Returns a BatchReport.
+    """
+    tasks = _plan_tasks(path, workers)
+    start = time.perf_counter()
+    results = []
+
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(use_gate, budget_ms)) as executor:
+            futures = [executor.submit(fn, *args) for fn, args in tasks]
+            for future in futures:
+                results.extend(future.result())
+    else:
+        _init_worker(use_gate, budget_ms)
+        for fn, args in tasks:
+            results.extend(fn(*args))
+
+    return BatchReport(results, time.perf_counter() - start, workers)
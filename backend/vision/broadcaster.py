@@ -0,0 +1,113 @@
+import cv2
+import threading
+import time
+
+from backend import metrics
+
+class FrameSubscriber:
+    """
+    One /video_feed viewer. Always receives the newest encoded frame; frames
+    published while the client was busy sending are skipped, not queued.
+    """
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.last_seq = broadcaster.seq
+        self.sent = 0
+        self.dropped = 0
+
+    def next_frame(self, timeout=1.0):
+        """Blocks until a frame newer than the last one sent arrives. Returns None on timeout."""
+        seq, frame_bytes = self.broadcaster.wait_newer(self.last_seq, timeout)
+        if frame_bytes is None:
+            return None
+        if self.last_seq:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.sent += 1
+        return frame_bytes
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class FrameBroadcaster:
+    """
+    Encodes each annotated frame exactly once and fans the JPEG bytes out to
+    every subscriber. Only the newest encoded frame is kept: a viewer that
+    falls behind skips to it, so readers never copy or re-encode anything.
+    """
+    def __init__(self, jpeg_quality=80, max_width=1280, name="stream"):
+        self.name = name  # Label of the encode metrics
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_width = int(max_width)  # 0 disables downscaling
+        self.latest = (0, None)  # (seq, jpeg_bytes); the bytes object is immutable, so it is shared as is
+        self.seq = 0
+        self.frames_encoded = 0
+
+        self._subscribers = set()
+        self._cond = threading.Condition()
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self):
+        subscriber = FrameSubscriber(self)
+        with self._cond:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            self._subscribers.discard(subscriber)
+
+    def encode(self, frame):
+        """Downscales to max_width if needed and encodes to JPEG bytes."""
+        t0 = time.perf_counter()
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / float(width)
+            frame = cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        metrics.JPEG_ENCODE_SECONDS.observe(time.perf_counter() - t0, self.name)
+        if not ret:
+            return None
+        return buffer.tobytes()
+
+    def publish(self, frame):
+        """Encodes the frame once and wakes up all waiting subscribers."""
+        frame_bytes = self.encode(frame)
+        if frame_bytes is None:
+            return False
+
+        with self._cond:
+            self.seq += 1
+            self.latest = (self.seq, frame_bytes)
+            self.frames_encoded += 1
+            self._cond.notify_all()
+        return True
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        """Returns (seq, jpeg_bytes) of the newest frame after last_seq, or (last_seq, None)."""
+        with self._cond:
+            if self.seq <= last_seq:
+                self._cond.wait_for(lambda: self.seq > last_seq, timeout=timeout)
+            if self.seq <= last_seq:
+                return last_seq, None
+            return self.latest
+
+    def stats(self):
+        with self._cond:
+            subscribers = list(self._subscribers)
+        return {
+            "frames_encoded": self.frames_encoded,
+            "subscribers": len(subscribers),
+            "frames_sent": sum(s.sent for s in subscribers),
+            "frames_dropped": sum(s.dropped for s in subscribers),
+        }
@@ -1,38 +1,206 @@
-import cv2
+import os
+import sys
 import threading
 import time
 
+import cv2
+import numpy
+
+from backend import metrics
+
+# Capture backends by name (SCANNER_CAPTURE_BACKEND); "auto" picks one per source
+BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "v4l2": cv2.CAP_V4L2,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "ffmpeg": cv2.CAP_FFMPEG,
+    "gstreamer": cv2.CAP_GSTREAMER,
+}
+
+def default_backend(src):
+    """Backend for a source: FFMPEG for files and URLs, the native one for camera indexes."""
+    if isinstance(src, str):
+        return cv2.CAP_FFMPEG
+    if sys.platform.startswith("win"):
+        return cv2.CAP_DSHOW  # MSMF is slow to open and fails on some webcams
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    if sys.platform == "darwin":
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
 class VideoProcessor:
-    def __init__(self, src=0):
+    """
+    Captures frames in a background thread into a preallocated ring of
+    buffers. Every frame gets a sequence number so consumers can wait for a
+    new one (read_latest) instead of polling, and can read it without a copy.
+
+    Cameras are asked for `width`x`height` at `fps` in `fourcc` (e.g. MJPG,
+    which most USB webcams need for 720p at 30 fps) with a driver buffer of
+    one frame, so the detector gets recent frames at the size it works at.
+    Values the camera does not support are replaced by what it delivers (see
+    get_info()). Video files are played at their own frame rate, and from
+    the start again at the end if `loop` is set.
+    """
+    def __init__(self, src=0, ring_size=6, name=None, width=0, height=0, fps=0.0, fourcc="",
+                 backend="auto", loop=True):
         self.src = src
-        # Force DirectShow on Windows to avoid MSMF errors
-        self.cap = cv2.VideoCapture(self.src, cv2.CAP_DSHOW)
-        self.grabbed, self.frame = self.cap.read()
+        self.name = name or str(src)  # Label of the capture metrics
+        self.is_file = isinstance(src, str) and os.path.isfile(src)
+        self.loop = loop
+        self.cap = self._open(backend)
+        if self.cap.isOpened() and not self.is_file:
+            self._configure(width, height, fps, fourcc)
         self.started = False
-        self.read_lock = threading.Lock()
+
+        # Files are read as fast as the disk allows, so they are paced to the clip rate
+        clip_fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        self.frame_interval = 1.0 / clip_fps if clip_fps > 0 else 0.0
+
+        self.ring_size = ring_size
+        self.ring = [None] * ring_size
+        self.seq = 0          # Sequence number of the newest frame (0 = none yet)
+        self.new_frame = threading.Condition()
+
+        grabbed, frame = self.cap.read()
+        if grabbed:
+            self._allocate(frame)
+            self.ring[0] = frame
+            self.seq = 1
+        self.grabbed = grabbed
+        info = self.get_info()
+        print(f"[INFO] Capture {self.name}: {info['backend']} {info['width']}x{info['height']} "
+              f"@ {info['fps']:g} fps {info['fourcc'] or '-'}")
+
+    def _open(self, backend):
+        api = BACKENDS.get(backend) if backend != "auto" else default_backend(self.src)
+        if api is None:
+            print(f"[ERROR] Unknown capture backend '{backend}', using auto")
+            api = default_backend(self.src)
+        cap = cv2.VideoCapture(self.src, api)
+        if not cap.isOpened() and api != cv2.CAP_ANY:
+            # Backend not compiled into this OpenCV build: let OpenCV choose
+            cap.release()
+            cap = cv2.VideoCapture(self.src, cv2.CAP_ANY)
+        return cap
+
+    def _configure(self, width, height, fps, fourcc):
+        cap = self.cap
+        # FOURCC goes first: V4L2 resets the size when the pixel format changes
+        if fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc.upper().ljust(4)[:4]))
+        if width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        # Keep only the newest frame in the driver, older ones would be stale by the time we read them
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def get_info(self):
+        """What the source actually delivers (cameras may ignore the requested values)."""
+        cap = self.cap
+        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\0 ") if code > 0 else ""
+        frame = self.ring[(self.seq - 1) % self.ring_size] if self.seq else None
+        height, width = frame.shape[:2] if frame is not None else (
+            max(0, int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))), max(0, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))))
+        return {
+            "source": str(self.src),
+            "backend": cap.getBackendName() if cap.isOpened() else "closed",
+            "width": width,
+            "height": height,
+            "fps": round(max(0.0, cap.get(cv2.CAP_PROP_FPS)), 2),
+            "fourcc": fourcc if fourcc.isprintable() else "",
+            "file": self.is_file,
+            "grabbed": self.grabbed,
+        }
+
+    def _allocate(self, frame):
+        # Reused by cap.read() as long as the camera keeps the same resolution
+        for i in range(self.ring_size):
+            self.ring[i] = numpy.empty_like(frame)
 
     def start(self):
         if self.started:
             print("Video stream already started.")
             return None
         self.started = True
-        self.thread = threading.Thread(target=self.update, args=())
+        self.thread = threading.Thread(target=self.update, args=(), name=f"capture-{self.name}", daemon=True)
         self.thread.start()
         return self
 
     def update(self):
+        next_frame = time.monotonic()
         while self.started:
-            grabbed, frame = self.cap.read()
-            with self.read_lock:
-                self.grabbed = grabbed
-                self.frame = frame
-            time.sleep(0.01) # Small sleep to preventing CPU hogging
+            if self.frame_interval:
+                # File source: wait for the clip's next frame time instead of reading ahead
+                next_frame += self.frame_interval
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.monotonic()
+
+            slot = self.seq % self.ring_size
+            # cap.read() blocks until the camera delivers, so no sleep is needed here
+            t0 = time.perf_counter()
+            grabbed, frame = self.cap.read(self.ring[slot])
+            metrics.CAPTURE_SECONDS.observe(time.perf_counter() - t0, self.name)
+            if not grabbed and self.is_file and self.loop:
+                # End of the clip: rewind and play it again
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                grabbed, frame = self.cap.read(self.ring[slot])
+            if not grabbed:
+                metrics.CAPTURE_FAILURES.inc(self.name)
+                with self.new_frame:
+                    self.grabbed = False
+                time.sleep(0.1) # Camera unplugged/busy: retry without spinning
+                continue
+
+            with self.new_frame:
+                # A resolution change makes OpenCV return a new array instead of filling ours
+                self.ring[slot] = frame
+                self.grabbed = True
+                self.seq += 1
+                self.new_frame.notify_all()
+
+        with self.new_frame:
+            self.new_frame.notify_all()
+
+    def _slot(self, seq):
+        # Frame `seq` was written to slot (seq - 1) % ring_size
+        return self.ring[(seq - 1) % self.ring_size]
 
     def read(self):
-        with self.read_lock:
-            if not self.grabbed:
+        """Returns a private copy of the newest frame (safe to draw on), or None."""
+        with self.new_frame:
+            if not self.grabbed or self.seq == 0:
                 return None
-            return self.frame.copy()
+            return self._slot(self.seq).copy()
+
+    def read_latest(self, last_seq=0, timeout=1.0):
+        """
+        Waits until a frame newer than last_seq is available.
+        Returns (seq, frame) where frame is a read-only view into the ring
+        (no copy); (last_seq, None) on timeout. The view stays valid while
+        is_valid(seq) is True, copy it if you need it for longer.
+        """
+        with self.new_frame:
+            if self.seq <= last_seq:
+                self.new_frame.wait_for(lambda: self.seq > last_seq or not self.started, timeout=timeout)
+            if self.seq <= last_seq or not self.grabbed:
+                return last_seq, None
+            view = self._slot(self.seq).view()
+            view.setflags(write=False)
+            return self.seq, view
+
+    def is_valid(self, seq):
+        """True while frame `seq` has not been overwritten by the capture thread."""
+        return 0 < seq and self.seq - seq < self.ring_size - 1
 
     def stop(self):
         self.started = False
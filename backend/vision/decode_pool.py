@@ -0,0 +1,563 @@
+import cv2
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import numpy
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+from backend import metrics
+from backend.profiler import slow_frames
+from backend.vision.gating import ChangeGate
+from backend.vision.pipeline import _PacedThread
+from backend.vision.tracker import DetectionTracker
+
+def _decode_worker(conn, budget_ms, use_opencv_localizer):
+    """
+    Decode process. Frames arrive on its own pipe as (task_id, lane_id, slot,
+    block_name, shape, seq, skip_passes, regions) and are read straight from
+    the slot's shared memory block (reopened when the parent grows the slot),
+    so no pixel data is pickled; `regions` (or None for the whole
+    frame) are the boxes the lane's tracker wants decoded. The pipe is not
+    shared with other workers, so dying here can never leave a lock held.
+    """
+    # Imported here so the parent never loads pyzbar just to start the pool
+    from backend.vision.detector import BarcodeDetector
+
+    # The parent already gates each camera, the detector here only decodes
+    detector = BarcodeDetector(budget_ms=budget_ms, use_gate=False,
+                               use_opencv_localizer=use_opencv_localizer)
+    blocks = {}  # slot -> SharedMemory
+    frames_done = 0
+
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except (EOFError, OSError):
+                break  # The parent is gone
+            if task is None:
+                break
+
+            task_id, lane_id, slot, block_name, shape, seq, skip_passes, regions = task
+            if slot not in blocks or blocks[slot].name != block_name:
+                if slot in blocks:
+                    blocks[slot].close()
+                blocks[slot] = shared_memory.SharedMemory(name=block_name)
+            frame = numpy.ndarray(shape, dtype=numpy.uint8, buffer=blocks[slot].buf)
+            try:
+                _, codes = detector.detect(frame, annotate=False, skip_passes=skip_passes, regions=regions)
+                timings = dict(detector.last_timings)
+                tried = (detector.tried_passes, detector.settled)
+            except Exception as e:
+                print(f"[ERROR] Decode worker failed on {lane_id}: {e}")
+                codes = []
+                timings = None  # Counted as an error by the parent
+                tried = (frozenset(), False)
+            del frame
+
+            frames_done += 1
+            # Ship the detector counters now and then so the parent can report them
+            stats = (os.getpid(), detector.get_stats()) if frames_done % 50 == 1 else None
+            conn.send((task_id, lane_id, slot, seq, codes, stats, timings, tried))
+    finally:
+        conn.close()
+        for block in blocks.values():
+            block.close()
+
+class _LaneFeeder(_PacedThread):
+    """
+    Reads one lane's camera at decode_fps, gates the frame and submits it to
+    the pool. The lane's tracker lives here, since its frames go to any
+    worker: it decides per frame between a full decode, a decode of the
+    tracked boxes only (sent with the task) or no decode at all, and the
+    collector feeds it the results in frame order.
+    """
+
+    def __init__(self, pool, lane, decode_fps, tracker=None, use_gate=True):
+        super().__init__(decode_fps)
+        self.name = f"decode-feeder-{lane.lane_id}"
+        self.pool = pool
+        self.lane = lane
+        self.gate = ChangeGate() if use_gate else None
+        self.tracker = tracker
+        self.lock = threading.Lock()  # Tracker and results state, shared with the collector
+        self.modes = {}               # seq -> tracker mode of the frames being decoded
+        self.last_result_seq = 0
+        self.last_codes = []
+        self.last_seq = 0
+        # Passes the workers already ran on the current scene (see BarcodeDetector.settled)
+        self.tried_passes = frozenset()
+        self.settled = True
+
+    def step(self):
+        # Read-only view into the camera ring: copied once, straight into shared memory
+        seq, frame = self.lane.video.read_latest(self.last_seq, timeout=1.0)
+        if frame is None:
+            return
+        self.last_seq = seq
+
+        with self.lock:
+            mode = self.tracker.next_mode() if self.tracker is not None else DetectionTracker.FULL
+            if mode == DetectionTracker.HOLD:
+                # Confirmed codes still in view: reuse the tracked result, no decode at all
+                self.lane.bus.publish_detections(self.tracker.hold())
+                return
+            regions = self.tracker.regions() if mode == DetectionTracker.REGION else None
+
+        if self.gate is None:
+            decision = ChangeGate.DECODE
+        else:
+            decision = self.gate.check(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), settled=self.settled)
+        if decision == ChangeGate.RETRY:
+            # Same scene, nothing found yet: the workers try the passes it has not been through
+            skip_passes = self.tried_passes
+        elif decision == ChangeGate.DECODE:
+            skip_passes = frozenset()
+        else:
+            with self.lock:
+                if decision == ChangeGate.FLAT:
+                    self.last_codes = []
+                    if self.tracker is not None:
+                        self.tracker.reset()
+                elif self.tracker is not None:
+                    self.tracker.hold()
+                codes = [dict(c) for c in self.last_codes]
+            self.lane.bus.publish_detections(codes)
+            return
+
+        # Recorded first: the result can come back before submit() returns
+        with self.lock:
+            self.modes[seq] = mode
+        if not self.pool.submit(self.lane.lane_id, frame, seq, skip_passes, regions):
+            with self.lock:
+                self.modes.pop(seq, None)
+
+    def apply_result(self, seq, codes, tried):
+        """
+        Feeds a decoded frame to the tracker. Returns the codes to report, or
+        None if a newer frame of the lane was already applied (stale result).
+        """
+        with self.lock:
+            mode = self.modes.pop(seq, DetectionTracker.FULL)
+            for old in [s for s in self.modes if s < seq]:
+                del self.modes[old]  # Frames that never came back (dead worker)
+            if seq < self.last_result_seq:
+                return None
+            self.last_result_seq = seq
+            self.tried_passes, self.settled = tried
+            if self.tracker is not None:
+                codes = self.tracker.update(codes, mode)
+            self.last_codes = [dict(c) for c in codes]
+            return codes
+
+class DecodePool:
+    """
+    Spreads decoding of several cameras (checkout lanes) over M worker
+    processes, outside of the GIL of the web server.
+
+    Frames are copied once into a fixed number of shared memory slots (grown
+    if a camera starts delivering bigger frames); only the slot travels
+    through the pipe of the worker with the fewest frames pending. When every
+    slot is busy the new frame is dropped (backpressure) instead of piling up
+    latency, and a single lane can never hold more than
+    `max_inflight_per_lane` slots.
+
+    A worker process that dies (e.g. a crash inside zbar) is restarted and
+    the slots of the frames sent to it are given back. A worker that keeps
+    dying within `stable_after` seconds of starting without decoding anything
+    (e.g. zbar cannot be loaded) is restarted with exponential backoff; after
+    `max_quick_failures` such deaths in a row the pool stops itself and calls
+    `on_failure` (e.g. to decode in threads instead).
+    """
+    def __init__(self, lanes, workers=2, process_codes=None, decode_fps=10.0,
+                 budget_ms=40.0, use_opencv_localizer=False, slots_per_worker=2,
+                 max_inflight_per_lane=2, slot_bytes=None, make_tracker=None,
+                 use_gate=True, on_failure=None, max_quick_failures=5,
+                 restart_backoff=0.5, max_backoff=30.0, stable_after=10.0):
+        self.lanes = {lane.lane_id: lane for lane in lanes}
+        self.workers = max(1, workers)
+        self.process_codes = process_codes
+        self.decode_fps = decode_fps
+        self.budget_ms = budget_ms
+        self.use_opencv_localizer = use_opencv_localizer
+        self.n_slots = self.workers * slots_per_worker
+        self.max_inflight_per_lane = max_inflight_per_lane
+        self.slot_bytes = slot_bytes
+        # Callable() -> DetectionTracker, one per lane (None = report every read)
+        self.make_tracker = make_tracker
+        self.use_gate = use_gate
+        self.on_failure = on_failure
+        self.max_quick_failures = max_quick_failures
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        self.blocks = []
+        self.processes = []
+        self._conns = []  # Parent end of each worker's pipe
+        self._send_locks = []
+        self._assigned = []  # Task ids sent to each worker and not answered yet
+        self._spawned_at = []
+        self._quick_failures = []  # Per worker, deaths in a row soon after starting
+        self._respawn_at = {}  # index -> monotonic time of a delayed restart
+        self.feeders = []
+        self._feeders = {}  # lane_id -> _LaneFeeder
+        self.started = False
+        self.failed = False
+
+        self._free_slots = queue.Queue()
+        self._lock = threading.Lock()
+        self._inflight = {lane_id: 0 for lane_id in self.lanes}
+        self._tasks = {}  # task_id -> (lane_id, slot, worker) of the frames sent to a worker
+        self._task_ids = itertools.count(1)
+        self.restarts = 0
+        self.submitted = {lane_id: 0 for lane_id in self.lanes}
+        self.dropped = {lane_id: 0 for lane_id in self.lanes}
+        self.stale = {lane_id: 0 for lane_id in self.lanes}
+        self.decoded = {lane_id: 0 for lane_id in self.lanes}
+        self.worker_stats = {}
+
+    def _guess_slot_bytes(self):
+        sizes = []
+        for lane in self.lanes.values():
+            frame = lane.video.read()
+            if frame is not None:
+                sizes.append(frame.nbytes)
+        # Fall back to a 1080p BGR frame when no camera has delivered yet
+        return max(sizes) if sizes else 1920 * 1080 * 3
+
+    def start(self):
+        if self.started:
+            return self
+        self.started = True
+
+        size = self.slot_bytes or self._guess_slot_bytes()
+        self._slot_size = size
+        self.blocks = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.n_slots)]
+        for slot in range(self.n_slots):
+            self._free_slots.put(slot)
+
+        # "spawn" keeps the workers clean of the server's threads and camera handles
+        self._ctx = multiprocessing.get_context("spawn")
+        self._send_locks = [threading.Lock() for _ in range(self.workers)]
+        self._assigned = [set() for _ in range(self.workers)]
+        self.processes = [None] * self.workers
+        self._conns = [None] * self.workers
+        self._spawned_at = [0.0] * self.workers
+        self._quick_failures = [0] * self.workers
+        self._respawn_at = {}
+        for index in range(self.workers):
+            self._spawn(index)
+
+        self.collector = threading.Thread(target=self._collect, name="decode-collector", daemon=True)
+        self.collector.start()
+
+        self.feeders = [_LaneFeeder(self, lane, self.decode_fps,
+                                    tracker=self.make_tracker() if self.make_tracker else None,
+                                    use_gate=self.use_gate)
+                        for lane in self.lanes.values()]
+        self._feeders = {feeder.lane.lane_id: feeder for feeder in self.feeders}
+        for feeder in self.feeders:
+            feeder.start()
+        return self
+
+    def _spawn(self, index):
+        conn, child_conn = self._ctx.Pipe()
+        p = self._ctx.Process(target=_decode_worker, daemon=True, name=f"decode-worker-{index}",
+                              args=(child_conn, self.budget_ms, self.use_opencv_localizer))
+        p.start()
+        child_conn.close()  # Only the worker keeps it, so its death shows up as EOF
+        with self._lock:
+            self.processes[index] = p
+            self._conns[index] = conn
+            self._spawned_at[index] = time.monotonic()
+
+    def _restart(self, index):
+        """
+        Gives back the slots of the frames sent to a dead worker and restarts
+        it, right away or after a backoff if it died soon after starting.
+        Returns False when it keeps dying and the pool should give up.
+        """
+        p, conn = self.processes[index], self._conns[index]
+        # Results it sent before dying are still good
+        try:
+            while conn.poll():
+                self._handle_result(conn.recv())
+        except (EOFError, OSError):
+            pass
+        p.join(timeout=1.0)
+        metrics.ERRORS.inc("decode-worker")
+
+        with self._lock:
+            lost = list(self._assigned[index])
+            # Not picked by submit() until it is running again
+            self.processes[index] = None
+            self._conns[index] = None
+        for task_id in lost:
+            self._finish(task_id)
+        with self._send_locks[index]:
+            conn.close()
+        self.worker_stats.pop(p.pid, None)
+
+        if time.monotonic() - self._spawned_at[index] < self.stable_after:
+            self._quick_failures[index] += 1
+        else:
+            self._quick_failures[index] = 0
+        failures = self._quick_failures[index]
+        if failures >= self.max_quick_failures:
+            print(f"[ERROR] Decode worker {p.pid} died {failures} times in a row "
+                  f"(exit code {p.exitcode}), giving up on the decode pool")
+            return False
+
+        delay = min(self.max_backoff, self.restart_backoff * 2 ** (failures - 1)) if failures else 0.0
+        print(f"[ERROR] Decode worker {p.pid} died (exit code {p.exitcode}), "
+              f"restarting it in {delay:.1f}s")
+        self._respawn_at[index] = time.monotonic() + delay
+        with self._lock:
+            self.restarts += 1
+        return True
+
+    def _respawn_due(self):
+        """Starts the workers whose restart delay is over. Returns seconds to the next one."""
+        now = time.monotonic()
+        for index, at in list(self._respawn_at.items()):
+            if at <= now:
+                del self._respawn_at[index]
+                self._spawn(index)
+        if not self._respawn_at:
+            return None
+        return max(0.0, min(self._respawn_at.values()) - now)
+
+    def submit(self, lane_id, frame, seq, skip_passes=frozenset(), regions=None):
+        """Copies the frame into a free slot and queues it. Returns False if it was dropped."""
+        with self._lock:
+            if self._inflight[lane_id] >= self.max_inflight_per_lane:
+                self.dropped[lane_id] += 1
+                return False
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                self.dropped[lane_id] += 1
+                return False
+            self._inflight[lane_id] += 1
+
+        block = self.blocks[slot]
+        if frame.nbytes > block.size:
+            block = self._grow_slot(slot, lane_id, frame)
+
+        target = numpy.ndarray(frame.shape, dtype=numpy.uint8, buffer=block.buf)
+        numpy.copyto(target, frame)
+        del target
+
+        # The capture thread may have recycled the ring slot while we were copying
+        video = self.lanes[lane_id].video
+        if not video.is_valid(seq):
+            self._release(lane_id, slot)
+            with self._lock:
+                self.dropped[lane_id] += 1
+            return False
+
+        with self._lock:
+            running = [i for i in range(self.workers) if self._conns[i] is not None]
+            if not running:
+                index = None
+            else:
+                index = min(running, key=lambda i: len(self._assigned[i]))
+                task_id = next(self._task_ids)
+                self._tasks[task_id] = (lane_id, slot, index)
+                self._assigned[index].add(task_id)
+                conn = self._conns[index]
+                self.submitted[lane_id] += 1
+        if index is None:
+            # Every worker is waiting to be restarted
+            self._release(lane_id, slot)
+            with self._lock:
+                self.dropped[lane_id] += 1
+            return False
+        try:
+            with self._send_locks[index]:
+                conn.send((task_id, lane_id, slot, block.name, frame.shape, seq, skip_passes, regions))
+        except (OSError, ValueError):
+            # The worker died under us; _restart may have freed the slot already
+            self._finish(task_id)
+            with self._lock:
+                self.dropped[lane_id] += 1
+            return False
+        return True
+
+    def _grow_slot(self, slot, lane_id, frame):
+        """
+        Replaces a slot (which the caller holds) with a block big enough for
+        `frame`, e.g. after a camera changed resolution. Workers reopen it by
+        name; the old block goes away once they have let go of it.
+        """
+        with self._lock:
+            if frame.nbytes > self._slot_size:
+                self._slot_size = frame.nbytes
+                print(f"[WARN] Camera {lane_id} delivers {frame.shape[1]}x{frame.shape[0]} frames, "
+                      f"larger than the decode slots; growing them to {frame.nbytes} bytes")
+            size = self._slot_size
+        block = shared_memory.SharedMemory(create=True, size=size)
+        old, self.blocks[slot] = self.blocks[slot], block
+        old.close()
+        old.unlink()
+        return block
+
+    def _release(self, lane_id, slot):
+        with self._lock:
+            self._inflight[lane_id] -= 1
+        self._free_slots.put(slot)
+
+    def _finish(self, task_id):
+        """Frees the slot of a task, once: by its result or, if its worker died, by _restart."""
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return
+            lane_id, slot, index = task
+            self._assigned[index].discard(task_id)
+        self._release(lane_id, slot)
+
+    def _collect(self):
+        while self.started:
+            next_respawn = self._respawn_due()
+            timeout = 0.5 if next_respawn is None else min(0.5, next_respawn)
+            with self._lock:
+                watched = {}
+                for index, (p, conn) in enumerate(zip(self.processes, self._conns)):
+                    if conn is not None:
+                        watched[conn] = index
+                        watched[p.sentinel] = index
+            if watched:
+                ready = multiprocessing.connection.wait(list(watched), timeout=timeout)
+            else:
+                time.sleep(timeout)
+                ready = []
+            if not self.started:
+                break
+
+            dead = set()
+            for obj in ready:
+                index = watched[obj]
+                if index in dead:
+                    continue
+                if obj is self._conns[index]:
+                    try:
+                        result = obj.recv()
+                    except (EOFError, OSError):
+                        result = None
+                    if result is not None:
+                        # It decodes, so a later death is not a startup failure
+                        self._quick_failures[index] = 0
+                        self._handle_result(result)
+                        continue
+                # The worker exited or its pipe broke
+                dead.add(index)
+                if not self._restart(index):
+                    self._give_up()
+                    return
+
+    def _give_up(self):
+        # Runs on the collector thread, which stop() then does not wait for
+        self.failed = True
+        self.stop()
+        if self.on_failure:
+            try:
+                self.on_failure()
+            except Exception as e:
+                print(f"[ERROR] Decode pool fallback failed: {e}")
+
+    def _handle_result(self, result):
+        task_id, lane_id, slot, seq, codes, stats, timings, tried = result
+        self._finish(task_id)
+        if timings is None:
+            metrics.ERRORS.inc("decode-worker")
+        else:
+            metrics.observe_timings(lane_id, timings)
+            slow_frames.record(lane_id, timings)
+        if stats is not None:
+            pid, detector_stats = stats
+            self.worker_stats[pid] = detector_stats
+
+        lane = self.lanes[lane_id]
+        codes = self._feeders[lane_id].apply_result(seq, codes, tried)
+        if codes is None:
+            # Overtaken by a later frame of the lane (2 frames in flight)
+            with self._lock:
+                self.stale[lane_id] += 1
+            return
+
+        new_codes = []
+        try:
+            if codes and self.process_codes:
+                processed = self.process_codes(codes, lane_id)
+                new_codes = [c for c in processed if c.get('is_new')]
+        except Exception as e:
+            metrics.ERRORS.inc("process-codes")
+            print(f"[ERROR] Processing codes from {lane_id} failed: {e}")
+
+        with self._lock:
+            self.decoded[lane_id] += 1
+        lane.bus.publish_detections(codes, new_codes)
+
+    def stop(self):
+        if not self.started:
+            return
+        for feeder in self.feeders:
+            feeder.stop()
+        # Cleared first so the collector does not restart the workers as they exit
+        self.started = False
+        if threading.current_thread() is not self.collector:
+            self.collector.join(timeout=2.0)
+        for index, conn in enumerate(self._conns):
+            if conn is None:
+                continue
+            try:
+                with self._send_locks[index]:
+                    conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for p in self.processes:
+            if p is None:
+                continue
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+        for conn in self._conns:
+            if conn is not None:
+                conn.close()
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        self.processes = []
+        self._conns = []
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": sum(1 for conn in self._conns if conn is not None),
+                "restarts": self.restarts,
+                "failed": self.failed,
+                "slots": self.n_slots,
+                "free_slots": self._free_slots.qsize(),
+                "lanes": {
+                    lane_id: {
+                        "submitted": self.submitted[lane_id],
+                        "decoded": self.decoded[lane_id],
+                        "dropped": self.dropped[lane_id],
+                        "stale": self.stale[lane_id],
+                        "inflight": self._inflight[lane_id],
+                    }
+                    for lane_id in self.lanes
+                },
+                "detectors": dict(self.worker_stats),
+                "trackers": {feeder.lane.lane_id: feeder.tracker.get_stats()
+                             for feeder in self.feeders if feeder.tracker is not None},
+            }
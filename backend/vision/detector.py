@@ -1,9 +1,23 @@
 from pyzbar.pyzbar import decode, ZBarSymbol
 import cv2
 import numpy
+import time
+
+from backend.vision.scheduler import PassScheduler
+from backend.vision.gating import ChangeGate
+from backend.vision.localizer import BarcodeLocalizer
+from backend.vision.tracker import DetectionTracker
 
 class BarcodeDetector:
-    def __init__(self):
+    # Default order of the decode passes, cheapest/most productive first
+    PASSES = ("roi", "sharp", "otsu", "zoom")
+
+    # Frame widths decoded as they are; others are resized on every frame, so
+    # the cameras are asked for a resolution in this range (SCANNER_CAPTURE_WIDTH)
+    MIN_WIDTH = 800
+    MAX_WIDTH = 1280
+
+    def __init__(self, budget_ms=40.0, use_gate=True, use_opencv_localizer=False, tracker=None):
         # We restrict to common 1D codes to avoid PDF417 assertion failures on noise
         self.allowed_symbols = [
             ZBarSymbol.EAN13,
@@ -14,98 +28,261 @@ class BarcodeDetector:
             ZBarSymbol.UPCE
         ]
 
-    def detect(self, frame):
+        # Filters are built once instead of on every frame
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        self.sharpen_kernel = numpy.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+
+        # Learns which pass actually finds codes and keeps each frame within budget
+        self.scheduler = PassScheduler(self.PASSES, budget_ms=budget_ms)
+
+        # Skips pyzbar on static or featureless frames (idle till)
+        self.gate = ChangeGate() if use_gate else None
+        self._last_codes = []
+        # Passes already run on the current scene, and whether its result is final
+        # (codes found, or every pass tried). Unsettled scenes are not skipped by the gate.
+        self.tried_passes = frozenset()
+        self.settled = True
+
+        # Stage name -> seconds spent on the last detect() call
+        self.last_timings = {}
+
+        # Finds candidate barcode rectangles so only those crops get decoded
+        self.localizer = BarcodeLocalizer(use_opencv=use_opencv_localizer)
+
+        # Optional DetectionTracker: votes across frames and, while the codes
+        # in view are confirmed, decodes only their boxes
+        self.tracker = tracker
+        self.resized_frames = 0
+
+    @staticmethod
+    def _remap(barcodes, offset_x, offset_y, fx=1.0, fy=1.0):
+        """Maps pyzbar rects from a crop/resized image back to the image it was taken from."""
+        mapped = []
+        for b in barcodes:
+            r = b.rect
+            rect = r._replace(left=int(offset_x + r.left * fx), top=int(offset_y + r.top * fy),
+                              width=int(r.width * fx), height=int(r.height * fy))
+            mapped.append(b._replace(rect=rect))
+        return mapped
+
+    def _decode_region(self, detect_img, rect, target_size=480):
+        """Decodes a single crop, upscaled so its long side is about target_size pixels."""
+        x, y, w, h = rect
+        crop = detect_img[y:y+h, x:x+w]
+        if crop.size == 0:
+            return []
+
+        factor = min(3.0, target_size / float(max(w, h)))
+        if factor > 1.0:
+            crop = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_LINEAR)
+        else:
+            factor = 1.0
+
+        barcodes = decode(crop, symbols=self.allowed_symbols)
+        if not barcodes:
+            # Otsu on the crop alone adapts to the local lighting much better than on the full frame
+            _, binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            barcodes = decode(binary, symbols=self.allowed_symbols)
+
+        return self._remap(barcodes, x, y, 1.0 / factor, 1.0 / factor)
+
+    def _pass_roi(self, detect_img):
+        # Pass 0: Decode only the regions proposed by the localizer
+        found = {}
+        for rect in self.localizer.propose(detect_img):
+            for b in self._decode_region(detect_img, rect):
+                found.setdefault(b.data, b)
+        return list(found.values())
+
+    def _pass_sharp(self, detect_img):
+        # Pass 1: Sharpened Grayscale (Mild)
+        detect_img_sharp = cv2.filter2D(detect_img, -1, self.sharpen_kernel)
+        return decode(detect_img_sharp, symbols=self.allowed_symbols)
+
+    def _pass_otsu(self, detect_img):
+        # Pass 2: Otsu's Thresholding (High Contrast Black/White)
+        # Blur slightly before thresholding to remove noise
+        blur = cv2.GaussianBlur(detect_img, (5, 5), 0)
+        _, binary = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return decode(binary, symbols=self.allowed_symbols)
+
+    def _pass_zoom(self, detect_img):
+        # Pass 3: Zoomed/Cropped Center (simulate "focusing" on center)
+        h, w = detect_img.shape
+        cx, cy = w // 2, h // 2
+        half_w, half_h = w // 4, h // 4 # Grab center 50%
+        cropped = detect_img[cy-half_h:cy+half_h, cx-half_w:cx+half_w]
+        # Resize crop back to full size
+        zoomed = cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LINEAR)
+        # Threshold the zoom
+        _, binary_zoom = cv2.threshold(zoomed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        barcodes = decode(binary_zoom, symbols=self.allowed_symbols)
+        # Undo the zoom so the boxes land on the right spot of the frame
+        return self._remap(barcodes, cx - half_w, cy - half_h, (2 * half_w) / float(w), (2 * half_h) / float(h))
+
+    def _decode_tracked(self, detect_img, scale, regions, margin=0.25):
+        """Decodes the tracked boxes (frame coordinates), grown by `margin` to allow for motion."""
+        found = {}
+        img_h, img_w = detect_img.shape[:2]
+        for x, y, w, h in regions:
+            pad_x, pad_y = int(w * margin) + 8, int(h * margin) + 8
+            x0 = max(0, int((x - pad_x) * scale))
+            y0 = max(0, int((y - pad_y) * scale))
+            x1 = min(img_w, int((x + w + pad_x) * scale))
+            y1 = min(img_h, int((y + h + pad_y) * scale))
+            if x1 <= x0 or y1 <= y0:
+                continue
+            for b in self._decode_region(detect_img, (x0, y0, x1 - x0, y1 - y0)):
+                found.setdefault(b.data, b)
+        return list(found.values())
+
+    def detect(self, frame, annotate=True, skip_passes=(), regions=None):
         """
         Detects barcodes in a frame.
         Returns the frame with drawn rectangles and a list of detected codes.
+        With annotate=False the frame is left untouched (the streaming stage
+        draws the boxes itself on whatever frame it is about to send).
+        `skip_passes` are decode passes already tried on the same scene, and
+        `regions` the boxes of the tracked codes to decode instead of the
+        whole frame (the decode pool gates and tracks frames itself and
+        passes them in).
         """
+        t_start = time.perf_counter()
+        timings = self.last_timings = {}
+
         # Optimization: Resolution Handling
         height, width = frame.shape[:2]
         scale = 1.0
-        
+
         # If too big, downscale (speed). If too small, upscale (readability).
-        if width > 1280:
-            scale = 1280 / float(width)
-        elif width < 800:
+        if width > self.MAX_WIDTH:
+            scale = self.MAX_WIDTH / float(width)
+        elif width < self.MIN_WIDTH:
             scale = 2.0  # Upscale for small webcams to help pyzbar see gaps
-            
+
         # Convert to grayscale
+        t0 = time.perf_counter()
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
+        timings["grayscale"] = time.perf_counter() - t0
+
+        mode = self.tracker.next_mode() if self.tracker is not None else None
+        if regions is not None:
+            mode = DetectionTracker.REGION
+        elif mode == DetectionTracker.REGION:
+            regions = self.tracker.regions()
+        if mode == DetectionTracker.HOLD:
+            # Confirmed codes still in view: reuse the tracked result, no decode at all
+            detected_codes = self.tracker.hold()
+            if annotate:
+                self.annotate(frame, detected_codes)
+            timings["total"] = time.perf_counter() - t_start
+            return frame, detected_codes
+
+        # Cheap gate first: nothing changed -> same codes as before, no texture -> no codes
+        if self.gate is not None:
+            t0 = time.perf_counter()
+            decision = self.gate.check(gray, settled=self.settled)
+            timings["gate"] = time.perf_counter() - t0
+            if decision == ChangeGate.RETRY:
+                # Same scene, nothing found yet: only the passes it has not been through
+                skip_passes = self.tried_passes | set(skip_passes)
+            elif decision != ChangeGate.DECODE:
+                if decision == ChangeGate.FLAT:
+                    self._last_codes = []
+                    if self.tracker is not None:
+                        self.tracker.reset()
+                elif self.tracker is not None:
+                    self.tracker.hold()
+                detected_codes = [dict(c) for c in self._last_codes]
+                if annotate:
+                    self.annotate(frame, detected_codes)
+                timings["total"] = time.perf_counter() - t_start
+                return frame, detected_codes
+
+        t0 = time.perf_counter()
         if scale != 1.0:
+            self.resized_frames += 1
             detect_img = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_LINEAR)
         else:
             detect_img = gray
 
-        # 1. CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        detect_img = clahe.apply(detect_img)
-
-        # 2. Sharpening kernel (Mild)
-        kernel = numpy.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]]) 
-        detect_img_sharp = cv2.filter2D(detect_img, -1, kernel)
-        
-        # Pass 1: Sharpened Grayscale
-        barcodes = decode(detect_img_sharp, symbols=self.allowed_symbols)
-        
-        # Pass 2: Otsu's Thresholding (High Contrast Black/White)
-        if not barcodes:
-            # Blur slightly before thresholding to remove noise
-            blur = cv2.GaussianBlur(detect_img, (5, 5), 0)
-            _, binary = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            barcodes = decode(binary, symbols=self.allowed_symbols)
-            
-            # Debug: Show binary image logic (cannot show in web stream easily without changing return)
-            # if barcodes: print("[DEBUG] Detected via Otsu")
+        # CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        detect_img = self.clahe.apply(detect_img)
+        timings["preprocess"] = time.perf_counter() - t0
 
-        # Pass 3: Zoomed/Cropped Center (simulate "focusing" on center)
-        if not barcodes:
-             h, w = detect_img.shape
-             cx, cy = w // 2, h // 2
-             half_w, half_h = w // 4, h // 4 # Grab center 50%
-             cropped = detect_img[cy-half_h:cy+half_h, cx-half_w:cx+half_w]
-             # Resize crop back to full size
-             zoomed = cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LINEAR)
-             # Threshold the zoom
-             _, binary_zoom = cv2.threshold(zoomed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-             barcodes_zoom = decode(binary_zoom, symbols=self.allowed_symbols)
-             
-             for b in barcodes_zoom:
-                 # Need to adjust bbox coordinates back to full frame? 
-                 # This is complex for visualization. For now, let's just see if we can READ it.
-                 # If we read it, we accept it. The bounding box might look wrong but the DATA is good.
-                 # Let's map coordinates roughly or just accept the data.
-                 barcodes.append(b) 
+        if mode == DetectionTracker.REGION:
+            # Only the boxes of the codes being tracked
+            t0 = time.perf_counter()
+            barcodes = self._decode_tracked(detect_img, scale, regions)
+            timings["tracked"] = time.perf_counter() - t0
+            self.tried_passes = frozenset(skip_passes)
+        else:
+            # The scheduler picks which passes run (and in which order) on this frame
+            _, barcodes = self.scheduler.run({
+                "roi": lambda: self._pass_roi(detect_img),
+                "sharp": lambda: self._pass_sharp(detect_img),
+                "otsu": lambda: self._pass_otsu(detect_img),
+                "zoom": lambda: self._pass_zoom(detect_img),
+            }, exclude=skip_passes)
+            timings.update(self.scheduler.last_timings)
+            self.tried_passes = frozenset(skip_passes).union(self.scheduler.last_timings)
+        self.settled = bool(barcodes) or self.tried_passes.issuperset(self.PASSES)
 
         detected_codes = []
 
         for barcode in barcodes:
             # Extract bounding box location
             (x, y, w, h) = barcode.rect
-            
+
             # Map coordinates back to original size
             if scale != 1.0:
                 x = int(x / scale)
                 y = int(y / scale)
                 w = int(w / scale)
                 h = int(h / scale)
-            
+
             # Decode the barcode data
             barcode_data = barcode.data.decode("utf-8")
             barcode_type = barcode.type
 
-            # Draw the bounding box on the ORIGINAL frame
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-            # Draw label
-            text = f"{barcode_data} ({barcode_type})"
-            cv2.putText(frame, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX,
-                        0.5, (0, 255, 0), 2)
-
             detected_codes.append({
                 "data": barcode_data,
                 "type": barcode_type,
                 "bbox": [x, y, w, h]
             })
 
+        if self.tracker is not None:
+            detected_codes = self.tracker.update(detected_codes, mode)
+
+        self._last_codes = [dict(c) for c in detected_codes]
+        timings["total"] = time.perf_counter() - t_start
+
+        if annotate:
+            self.annotate(frame, detected_codes)
+
         return frame, detected_codes
+
+    def get_stats(self):
+        """Per-pass hit rate and latency counters, frames the gate skipped and frames that had to be resized."""
+        stats = self.scheduler.get_stats()
+        if self.gate is not None:
+            stats["gate"] = self.gate.get_stats()
+        if self.tracker is not None:
+            stats["tracker"] = self.tracker.get_stats()
+        stats["resized_frames"] = self.resized_frames
+        return stats
+
+    @staticmethod
+    def annotate(frame, codes):
+        """Draws the bounding box and label of each detected code on the frame."""
+        for code in codes:
+            x, y, w, h = code["bbox"]
+
+            # Draw the bounding box on the ORIGINAL frame
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+            # Draw label
+            text = f"{code['data']} ({code['type']})"
+            cv2.putText(frame, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (0, 255, 0), 2)
+        return frame
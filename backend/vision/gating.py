@@ -0,0 +1,96 @@
+import cv2
+import numpy
+
+class ChangeGate:
+    """
+    Cheap pre-stage that decides whether a frame is worth sending to pyzbar.
+    Works on downsampled grayscale copies (a tiny one for the change check and
+    one capped at the detector width for the texture check, so thin bars
+    don't blur away):
+
+    - STATIC: the scene barely changed since the last decoded frame, so the
+      previous result is still valid.
+    - RETRY: the scene barely changed, but the previous result was not final
+      (no code found and some decode passes not tried yet), so it is decoded
+      again with the remaining passes.
+    - FLAT: the scene changed but has no barcode-like structure (a band of
+      strong gradients in one direction and weak in the other).
+    - DECODE: anything else.
+
+    Every `max_skip` frames a decode is forced so a wrong decision never sticks.
+    """
+    DECODE = "decode"
+    STATIC = "static"
+    RETRY = "retry"
+    FLAT = "flat"
+
+    def __init__(self, diff_width=160, energy_width=1280, pixel_threshold=15,
+                 changed_fraction=0.002, energy_threshold=100.0, max_skip=30):
+        self.diff_width = diff_width
+        self.energy_width = energy_width
+        self.pixel_threshold = pixel_threshold    # Gray levels a pixel must move to count as changed
+        self.changed_fraction = changed_fraction  # Share of changed pixels that makes the scene "new"
+        self.energy_threshold = energy_threshold  # Peak local gradient anisotropy
+        self.max_skip = max_skip
+
+        self._reference = None
+        self._skipped_in_row = 0
+        self.counters = {self.DECODE: 0, self.STATIC: 0, self.RETRY: 0, self.FLAT: 0}
+
+    @staticmethod
+    def _downsample(gray, width):
+        h, w = gray.shape[:2]
+        if w <= width:
+            return gray
+        return cv2.resize(gray, (width, max(1, int(h * width / w))), interpolation=cv2.INTER_AREA)
+
+    def barcode_energy(self, gray):
+        """Peak of |gx| - |gy| averaged over small windows: high on stripes, low on flat or noisy areas."""
+        img = self._downsample(gray, self.energy_width)
+        gx = cv2.Sobel(img, cv2.CV_16S, 1, 0, ksize=3)
+        gy = cv2.Sobel(img, cv2.CV_16S, 0, 1, ksize=3)
+        anisotropy = cv2.absdiff(cv2.convertScaleAbs(gx), cv2.convertScaleAbs(gy))
+        local = cv2.blur(anisotropy, (15, 15))
+        return float(local.max())
+
+    def check(self, gray, settled=True):
+        """
+        Returns DECODE, STATIC, RETRY or FLAT for a grayscale frame. `settled`
+        tells whether the result of the last decode is final; if not, an
+        unchanged scene gives RETRY instead of STATIC.
+        """
+        small = self._downsample(gray, self.diff_width)
+
+        decision = self.DECODE
+        if self._skipped_in_row < self.max_skip:
+            if self._reference is not None and self._reference.shape == small.shape:
+                # Counting changed pixels (instead of a mean) still catches a small barcode entering the frame
+                changed = numpy.count_nonzero(cv2.absdiff(small, self._reference) > self.pixel_threshold)
+                if changed < self.changed_fraction * small.size:
+                    decision = self.STATIC if settled else self.RETRY
+            if decision == self.DECODE and self.barcode_energy(gray) < self.energy_threshold:
+                decision = self.FLAT
+
+        if decision == self.STATIC:
+            self._skipped_in_row += 1
+        elif decision == self.RETRY:
+            # Decoded, but the reference stays: it is still the same scene
+            self._skipped_in_row = 0
+        else:
+            # Compare against the last frame that was actually looked at, so slow drifts still add up
+            self._reference = small
+            self._skipped_in_row = 0 if decision == self.DECODE else self._skipped_in_row + 1
+
+        self.counters[decision] += 1
+        return decision
+
+    def get_stats(self):
+        total = sum(self.counters.values())
+        return {
+            "frames": total,
+            "decoded": self.counters[self.DECODE] + self.counters[self.RETRY],
+            "retried": self.counters[self.RETRY],
+            "skipped_static": self.counters[self.STATIC],
+            "skipped_flat": self.counters[self.FLAT],
+            "skip_rate": round((self.counters[self.STATIC] + self.counters[self.FLAT]) / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,88 @@
+import cv2
+import numpy
+
+class BarcodeLocalizer:
+    """
+    Proposes candidate rectangles that probably contain a 1D barcode, so the
+    decoder only has to look at small crops instead of the whole frame.
+
+    By default a gradient/morphology detector is used: stripes have strong
+    gradients in one direction and almost none in the other, which closing
+    with an elongated kernel turns into solid blobs. With use_opencv=True,
+    OpenCV's `barcode` module is used when available (more precise, but
+    several times slower), falling back to the gradient detector.
+    """
+    def __init__(self, max_candidates=4, min_area=1500, padding=0.15, work_width=640, use_opencv=False):
+        self.max_candidates = max_candidates
+        self.min_area = min_area        # In pixels of the input image
+        self.padding = padding          # Extra margin around each box (quiet zone)
+        self.work_width = work_width    # Morphology runs at this width for speed
+
+        self._cv_detector = None
+        if use_opencv and hasattr(cv2, "barcode"):
+            try:
+                self._cv_detector = cv2.barcode.BarcodeDetector()
+            except Exception:
+                self._cv_detector = None
+
+    def propose(self, gray):
+        """Returns a list of (x, y, w, h) rectangles in `gray` coordinates, largest first."""
+        rects = self._propose_opencv(gray) if self._cv_detector is not None else None
+        if not rects:
+            rects = self._propose_gradient(gray)
+
+        h, w = gray.shape[:2]
+        padded = [self._pad(r, w, h) for r in rects if r[2] * r[3] >= self.min_area]
+        padded.sort(key=lambda r: r[2] * r[3], reverse=True)
+        return padded[:self.max_candidates]
+
+    def _propose_opencv(self, gray):
+        try:
+            ok, points = self._cv_detector.detectMulti(gray)
+        except cv2.error:
+            return []
+        if not ok or points is None:
+            return []
+        return [cv2.boundingRect(numpy.int32(p).reshape(-1, 1, 2)) for p in points]
+
+    def _propose_gradient(self, gray):
+        h, w = gray.shape[:2]
+        factor = 1.0
+        img = gray
+        if w > self.work_width:
+            factor = w / float(self.work_width)
+            img = cv2.resize(gray, (self.work_width, int(h / factor)), interpolation=cv2.INTER_AREA)
+
+        gx = cv2.convertScaleAbs(cv2.Scharr(img, cv2.CV_16S, 1, 0))
+        gy = cv2.convertScaleAbs(cv2.Scharr(img, cv2.CV_16S, 0, 1))
+
+        rects = []
+        # Vertical bars close horizontally, horizontal bars (rotated code) close vertically
+        for vertical_bars in (True, False):
+            stripes = cv2.subtract(gx, gy) if vertical_bars else cv2.subtract(gy, gx)
+            kernel_size = (21, 7) if vertical_bars else (7, 21)
+            blurred = cv2.blur(stripes, (9, 9))
+            _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+            # Remove thin noise, then grow back
+            mask = cv2.erode(mask, None, iterations=3)
+            mask = cv2.dilate(mask, None, iterations=3)
+
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for c in contours:
+                x, y, bw, bh = cv2.boundingRect(c)
+                # A single edge gives a thin blob along the edge; a barcode spans
+                # a good distance across its bars too
+                across, along = (bw, bh) if vertical_bars else (bh, bw)
+                if across < 0.4 * along:
+                    continue
+                rects.append((int(x * factor), int(y * factor), int(bw * factor), int(bh * factor)))
+        return rects
+
+    def _pad(self, rect, img_w, img_h):
+        x, y, w, h = rect
+        px, py = int(w * self.padding), int(h * self.padding)
+        x0, y0 = max(0, x - px), max(0, y - py)
+        x1, y1 = min(img_w, x + w + px), min(img_h, y + h + py)
+        return (x0, y0, x1 - x0, y1 - y0)
@@ -0,0 +1,214 @@
+import collections
+import threading
+import time
+
+from backend import metrics
+from backend.profiler import slow_frames
+from backend.vision.detector import BarcodeDetector
+
+class ResultsBus:
+    """
+    Shared hand-off point between the detection stage and the HTTP layer.
+    Holds the latest detections (for the overlay), pushes new scans to the
+    event bus and keeps the last ones for clients still polling
+    /api/latest_codes.
+    """
+    def __init__(self, lane_id=None, events=None, max_pending=100):
+        self._lock = threading.Lock()
+        self.lane_id = lane_id
+        self.events = events
+
+        self._detections = []
+        self._detections_time = 0.0
+        # Bounded, so scans nobody polls for don't pile up
+        self._new_codes = collections.deque(maxlen=max_pending)
+
+    def publish_detections(self, codes, new_codes=None):
+        for code in new_codes or []:
+            if self.events is not None:
+                # The event id tells clients (and POST /api/codes) which scan this is,
+                # so it is in the code before any subscriber can see the event
+                code['scan_id'] = self.events.reserve_id()
+                self.events.publish("scan", code, lane=self.lane_id, event_id=code['scan_id'])
+
+        with self._lock:
+            self._detections = codes
+            self._detections_time = time.time()
+            if new_codes:
+                self._new_codes.extend(new_codes)
+
+    def publish_update(self, update):
+        """Queues a late update about an earlier scan (e.g. its resolved product name)."""
+        if self.events is not None:
+            self.events.publish(update.get("event", "update"), update, lane=self.lane_id)
+        with self._lock:
+            self._new_codes.append(update)
+
+    def latest_detections(self, max_age=None):
+        """Returns the last decoded codes, or [] if they are older than max_age seconds."""
+        with self._lock:
+            if max_age is not None and time.time() - self._detections_time > max_age:
+                return []
+            return list(self._detections)
+
+    def drain_new_codes(self):
+        with self._lock:
+            codes = list(self._new_codes)
+            self._new_codes.clear()
+            return codes
+
+class _PacedThread:
+    """Runs self.step() in a background thread at a fixed rate."""
+    name = "worker"
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.started = False
+        self.thread = None
+
+    def start(self):
+        if self.started:
+            return self
+        self.started = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.started = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.started:
+            try:
+                self.step()
+            except Exception as e:
+                metrics.ERRORS.inc(self.name)
+                print(f"[ERROR] {self.name} failed: {e}")
+                time.sleep(1)
+
+            # Sleep only for what is left of the period, so slow steps don't drift
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def step(self):
+        raise NotImplementedError
+
+class DetectionWorker(_PacedThread):
+    """
+    Single background decode stage. Pulls the newest camera frame at
+    decode_fps, runs the detector once and publishes the results, no matter
+    how many clients are watching the stream.
+    """
+    name = "detection-worker"
+
+    def __init__(self, video, detector, bus, process_codes=None, decode_fps=10.0):
+        super().__init__(decode_fps)
+        self.video = video
+        self.detector = detector
+        self.bus = bus
+        # Callable(codes) -> codes, used to validate/dedup and attach product info
+        self.process_codes = process_codes
+        self.last_seq = 0
+        self.torn_frames = 0
+
+    def step(self):
+        # Read-only view of the newest frame; the detector never writes to it
+        seq, frame = self.video.read_latest(self.last_seq, timeout=1.0)
+        if frame is None:
+            return
+        self.last_seq = seq
+
+        _, codes = self.detector.detect(frame, annotate=False)
+        metrics.observe_timings(self.bus.lane_id, self.detector.last_timings)
+        slow_frames.record(self.bus.lane_id, self.detector.last_timings)
+        # A decode longer than the ring window may have read a half-overwritten frame
+        if not self.video.is_valid(seq):
+            self.torn_frames += 1
+            return
+
+        new_codes = []
+        if codes and self.process_codes:
+            processed = self.process_codes(codes)
+            new_codes = [c for c in processed if c.get('is_new')]
+
+        self.bus.publish_detections(codes, new_codes)
+
+class StreamRenderer(_PacedThread):
+    """
+    Draws the latest detections on the newest frame at stream_fps and hands
+    it to the broadcaster, which encodes it once for every /video_feed client.
+    Nothing is drawn or encoded while nobody is watching.
+    """
+    name = "stream-renderer"
+
+    def __init__(self, video, bus, broadcaster, stream_fps=25.0, overlay_ttl=0.5):
+        super().__init__(stream_fps)
+        self.video = video
+        self.bus = bus
+        self.broadcaster = broadcaster
+        self.overlay_ttl = overlay_ttl
+        self.last_seq = 0
+
+    def step(self):
+        if not self.broadcaster.has_subscribers:
+            return
+
+        # Only new camera frames are encoded, even if stream_fps is above the camera rate
+        seq, view = self.video.read_latest(self.last_seq, timeout=1.0)
+        if view is None:
+            return
+        self.last_seq = seq
+
+        # The overlay is drawn on a private copy, the ring buffer stays untouched
+        frame = view.copy()
+        BarcodeDetector.annotate(frame, self.bus.latest_detections(max_age=self.overlay_ttl))
+        self.broadcaster.publish(frame)
+
+class Lane:
+    """
+    One checkout lane: a camera with its own results bus and MJPEG stream.
+    Decoding is either done by an in-process DetectionWorker (attach_detector)
+    or by a shared DecodePool that publishes to the lane's bus.
+    """
+    def __init__(self, lane_id, video, broadcaster, stream_fps=25.0, overlay_ttl=0.5, events=None):
+        self.lane_id = lane_id
+        self.video = video
+        self.bus = ResultsBus(lane_id, events=events)
+        self.broadcaster = broadcaster
+        self.renderer = StreamRenderer(video, self.bus, broadcaster,
+                                       stream_fps=stream_fps, overlay_ttl=overlay_ttl)
+        # Thread names tell the lanes apart in profiles
+        self.renderer.name = f"stream-renderer-{lane_id}"
+        self.detector = None
+        self.worker = None
+
+    def attach_detector(self, detector, process_codes=None, decode_fps=10.0):
+        """Decodes this lane in its own background thread."""
+        self.detector = detector
+        lane_process = None
+        if process_codes:
+            lane_process = lambda codes: process_codes(codes, self.lane_id)
+        self.worker = DetectionWorker(self.video, detector, self.bus,
+                                      process_codes=lane_process, decode_fps=decode_fps)
+        self.worker.name = f"detection-worker-{self.lane_id}"
+        return self
+
+    def start(self):
+        self.video.start()
+        if self.worker is not None:
+            self.worker.start()
+        self.renderer.start()
+        return self
+
+    def stop(self):
+        self.renderer.stop()
+        if self.worker is not None:
+            self.worker.stop()
+        self.video.stop()
@@ -0,0 +1,146 @@
+import threading
+import time
+
+class PassStats:
+    """Counters for a single decode pass."""
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.deferred_streak = 0  # Consecutive frames this pass was skipped
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    @property
+    def avg_ms(self):
+        return (self.total_time / self.attempts) * 1000 if self.attempts else 0.0
+
+    def as_dict(self):
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hit_rate, 4),
+            "avg_ms": round(self.avg_ms, 3),
+        }
+
+class PassScheduler:
+    """
+    Decides which decode passes run on each frame and in which order.
+
+    - Passes are ranked by hits per millisecond once every pass has been
+      tried `warmup` times; until then the default order is kept.
+    - The best pass always runs. The remaining ones only run while the frame
+      still has budget left; the ones that didn't fit are rotated to the front
+      of the queue on the next frame, so expensive fallbacks are spread out
+      instead of all running on every empty frame.
+    - A pass that almost never hits is only explored every `explore_interval` frames.
+    - No pass is skipped for more than `explore_interval` frames in a row, so
+      fallbacks still get their turn (one per frame) when the budget is tight.
+    """
+    def __init__(self, pass_names, budget_ms=40.0, warmup=30,
+                 min_hit_rate=0.01, explore_interval=10):
+        self.pass_names = list(pass_names)
+        self.budget = budget_ms / 1000.0
+        self.warmup = warmup
+        self.min_hit_rate = min_hit_rate
+        self.explore_interval = explore_interval
+
+        self.stats = {name: PassStats() for name in self.pass_names}
+        self.frames = 0
+        self.frames_over_budget = 0
+        self._rotation = 0
+        self._lock = threading.Lock()
+        self.last_timings = {}  # Pass name -> seconds, for the passes that ran on the last frame
+
+    def _score(self, name):
+        s = self.stats[name]
+        # Laplace smoothing so a single lucky hit doesn't dominate
+        return ((s.hits + 1) / (s.attempts + 2)) / max(s.avg_ms, 0.1)
+
+    def ordered(self):
+        """Current pass order: best first, then the fallbacks in rotation."""
+        if all(self.stats[n].attempts >= self.warmup for n in self.pass_names):
+            order = sorted(self.pass_names, key=self._score, reverse=True)
+        else:
+            order = list(self.pass_names)
+
+        primary, fallbacks = order[0], order[1:]
+        if fallbacks:
+            k = self._rotation % len(fallbacks)
+            fallbacks = fallbacks[k:] + fallbacks[:k]
+        return [primary] + fallbacks
+
+    def _is_cold(self, name):
+        s = self.stats[name]
+        return s.attempts >= self.warmup and s.hit_rate < self.min_hit_rate
+
+    def run(self, passes, exclude=()):
+        """
+        Runs the scheduled passes until one returns results.
+        passes: dict of name -> callable() returning a list of decoded barcodes.
+        exclude: passes not to run at all (e.g. already tried on the same scene).
+        Returns (pass_name, barcodes); pass_name is None when nothing was found.
+        """
+        with self._lock:
+            self.frames += 1
+            order = [name for name in self.ordered() if name not in exclude]
+
+        start = time.perf_counter()
+        deferred = False
+        forced = False
+        self.last_timings = {}
+
+        for i, name in enumerate(order):
+            s = self.stats[name]
+            if i > 0:
+                elapsed = time.perf_counter() - start
+                out_of_budget = elapsed + s.avg_ms / 1000.0 > self.budget
+                resting = self._is_cold(name) and self.frames % self.explore_interval != 0
+                starving = s.deferred_streak >= self.explore_interval and not forced
+                if (out_of_budget or resting) and not starving:
+                    with self._lock:
+                        s.skipped += 1
+                        s.deferred_streak += 1
+                    deferred = deferred or out_of_budget
+                    continue
+                forced = forced or starving
+
+            t0 = time.perf_counter()
+            barcodes = passes[name]()
+            dt = time.perf_counter() - t0
+            self.last_timings[name] = dt
+
+            with self._lock:
+                s.attempts += 1
+                s.total_time += dt
+                s.deferred_streak = 0
+                if barcodes:
+                    s.hits += 1
+
+            if barcodes:
+                self._finish(start, deferred)
+                return name, barcodes
+
+        self._finish(start, deferred)
+        return None, []
+
+    def _finish(self, start, deferred):
+        with self._lock:
+            if time.perf_counter() - start > self.budget:
+                self.frames_over_budget += 1
+            if deferred:
+                self._rotation += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "frames_over_budget": self.frames_over_budget,
+                "budget_ms": self.budget * 1000,
+                "order": self.ordered(),
+                "passes": {name: s.as_dict() for name, s in self.stats.items()},
+            }
@@ -0,0 +1,147 @@
+import itertools
+from collections import Counter
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+class Track:
+    """One barcode followed across frames, with the reads voted at its position."""
+    def __init__(self, track_id, code):
+        self.id = track_id
+        self.votes = Counter()
+        self.types = {}
+        self.bbox = code["bbox"]
+        self.missed = 0
+        self.confirmed = False
+        self.read(code)
+
+    def read(self, code):
+        self.votes[code["data"]] += 1
+        self.types[code["data"]] = code["type"]
+        self.bbox = code["bbox"]
+        self.missed = 0
+
+    @property
+    def data(self):
+        return self.votes.most_common(1)[0][0]
+
+    def as_code(self):
+        data = self.data
+        return {"data": data, "type": self.types[data], "bbox": list(self.bbox)}
+
+class DetectionTracker:
+    """
+    Associates decoded barcodes across frames (same data, or overlapping
+    boxes) and votes on what each one says:
+
+    - A code is reported only after `confirm_reads` reads agree, so a one-off
+      misread of a noisy pass never becomes a scan.
+    - While every code in view is confirmed, the full frame is decoded only
+      every `full_every` frames (to spot new codes); in between, just the
+      tracked boxes are decoded, every `region_every` frames, and the other
+      frames reuse the tracked result.
+    - A track is dropped after `max_missed` decodes that did not find it.
+
+    next_mode() tells the detector what to do with a frame; update() and
+    hold() return the confirmed codes to report.
+    """
+    FULL = "full"
+    REGION = "region"
+    HOLD = "hold"
+
+    def __init__(self, confirm_reads=2, iou_threshold=0.3, max_missed=2, region_every=2, full_every=10):
+        self.confirm_reads = max(1, confirm_reads)
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.region_every = max(1, region_every)
+        self.full_every = max(1, full_every)
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._since_full = 0
+        self._since_decode = 0
+        self.counters = {self.FULL: 0, self.REGION: 0, self.HOLD: 0, "confirmed": 0, "rejected": 0}
+
+    def next_mode(self):
+        """FULL, REGION or HOLD for the next frame."""
+        if not self.tracks or any(not t.confirmed for t in self.tracks) or self._since_full + 1 >= self.full_every:
+            mode = self.FULL
+        elif self._since_decode + 1 >= self.region_every:
+            mode = self.REGION
+        else:
+            mode = self.HOLD
+        self.counters[mode] += 1
+        return mode
+
+    def regions(self):
+        """Boxes of the tracked codes, (x, y, w, h) in frame coordinates."""
+        return [t.bbox for t in self.tracks]
+
+    def _match(self, code, unmatched):
+        # Same data wins (the code moved fast); otherwise the most overlapping box
+        for track in unmatched:
+            if track.data == code["data"]:
+                return track
+        best, best_iou = None, self.iou_threshold
+        for track in unmatched:
+            overlap = iou(track.bbox, code["bbox"])
+            if overlap >= best_iou:
+                best, best_iou = track, overlap
+        return best
+
+    def update(self, codes, mode=FULL):
+        """Feeds the codes decoded in FULL or REGION mode. Returns the confirmed codes in view."""
+        self._since_decode = 0
+        self._since_full = 0 if mode == self.FULL else self._since_full + 1
+
+        unmatched = list(self.tracks)
+        seen = []
+        for code in codes:
+            track = self._match(code, unmatched)
+            if track is None:
+                track = Track(next(self._ids), code)
+                self.tracks.append(track)
+            else:
+                unmatched.remove(track)
+                track.read(code)
+            if not track.confirmed and track.votes[track.data] >= self.confirm_reads:
+                track.confirmed = True
+                self.counters["confirmed"] += 1
+            seen.append(track)
+
+        for track in unmatched:
+            track.missed += 1
+            if track.missed > self.max_missed:
+                self.tracks.remove(track)
+                if not track.confirmed:
+                    self.counters["rejected"] += 1
+
+        reported = {}
+        for track in seen:
+            if track.confirmed:
+                reported.setdefault(track.data, track.as_code())
+        return list(reported.values())
+
+    def hold(self):
+        """Confirmed codes of a frame that was not decoded (HOLD), as last seen."""
+        self._since_decode += 1
+        self._since_full += 1
+        reported = {}
+        for track in self.tracks:
+            if track.confirmed and track.missed == 0:
+                reported.setdefault(track.data, track.as_code())
+        return list(reported.values())
+
+    def reset(self):
+        self.tracks = []
+
+    def get_stats(self):
+        return dict(self.counters, tracks=len(self.tracks),
+                    confirmed_tracks=sum(1 for t in self.tracks if t.confirmed))
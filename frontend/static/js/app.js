@@ -133,44 +133,127 @@ initChart();
 fetchCodes();
 updateChart();
 
-// Polling for new codes
-setInterval(async () => {
-    if (isModalOpen) return;
+// Scans whose product name is still being looked up by the server
+// Key: barcode, Value: { code, timer }
+const resolvingCodes = new Map();
+const NAME_WAIT_MS = 6000; // After this, let the user type the name
+
+function flashOverlay(text, color) {
+    const ov = document.getElementById('overlay');
+    ov.style.background = color;
+    ov.textContent = text;
+
+    setTimeout(() => {
+        ov.style.background = 'rgba(0, 0, 0, 0.6)';
+        ov.textContent = 'Escaneo Activo...';
+    }, 1000);
+}
 
-    try {
-        const response = await fetch('/api/latest_codes');
-        const codes = await response.json();
-
-        if (codes && codes.length > 0) {
-            const codeObj = codes[0];
-            const codeStr = codeObj.data;
-
-            if (!scannedCodes.has(codeStr)) {
-                // Determine if we should auto-add or open modal
-                const isKnown = codeObj.product_name && codeObj.product_name !== "Product Unknown";
-
-                // Feedback (Beep and Flash)
-                audio.beep();
-                const ov = document.getElementById('overlay');
-                ov.style.background = isKnown ? 'var(--accent)' : 'var(--primary)';
-                ov.textContent = isKnown ? `RECONOCIDO (${codeObj.scan_count}x)` : 'NUEVO CÓDIGO';
-
-                setTimeout(() => {
-                    ov.style.background = 'rgba(0, 0, 0, 0.6)';
-                    ov.textContent = 'Escaneo Activo...';
-                }, 1000);
-
-                if (isKnown) {
-                    await saveCode(codeObj);
-                } else {
-                    openModal(codeObj);
-                }
+async function handleNamedCode(codeObj) {
+    // Determine if we should auto-add or open modal
+    const isKnown = codeObj.product_name && codeObj.product_name !== "Product Unknown";
+
+    if (isKnown) {
+        flashOverlay(`RECONOCIDO (${codeObj.scan_count}x)`, 'var(--accent)');
+        await saveCode(codeObj);
+    } else if (!isModalOpen) {
+        flashOverlay('NUEVO CÓDIGO', 'var(--primary)');
+        openModal(codeObj);
+    }
+}
+
+async function handleServerCode(codeObj) {
+    const codeStr = codeObj.data;
+
+    // No scanning while a dialog is open (late names of earlier scans still count)
+    if (isModalOpen && codeObj.event !== 'name') return;
+
+    if (codeObj.event === 'name') {
+        // Late product name for a scan we already beeped for
+        const pending = resolvingCodes.get(codeStr);
+        if (!pending) return;
+        clearTimeout(pending.timer);
+        resolvingCodes.delete(codeStr);
+        await handleNamedCode({ ...pending.code, product_name: codeObj.product_name });
+        return;
+    }
+
+    if (scannedCodes.has(codeStr) || resolvingCodes.has(codeStr)) return;
+
+    // Feedback (Beep and Flash)
+    audio.beep();
+
+    if (codeObj.resolving) {
+        flashOverlay('BUSCANDO PRODUCTO...', 'var(--primary)');
+        const timer = setTimeout(() => {
+            resolvingCodes.delete(codeStr);
+            handleNamedCode({ ...codeObj, product_name: null });
+        }, NAME_WAIT_MS);
+        resolvingCodes.set(codeStr, { code: codeObj, timer });
+        return;
+    }
+
+    await handleNamedCode(codeObj);
+}
+
+// Another tab (or this one) saved or deleted codes
+let chartTimer = null;
+function applyStatsEvent(stats) {
+    if (stats.action === 'created') {
+        addSavedCode(stats.code);
+    } else if (stats.action === 'deleted') {
+        removeLocalCode(stats.id);
+    } else if (stats.action === 'cleared') {
+        allCodes = [];
+        scannedCodes.clear();
+    }
+
+    filterAndRender();
+    updateStats();
+    // Several saves in a row only refresh the chart once
+    clearTimeout(chartTimer);
+    chartTimer = setTimeout(updateChart, 1000);
+}
+
+// Server push: scans arrive as soon as they are decoded, no polling load
+function connectEvents() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/events');
+    source.addEventListener('scan', e => handleServerCode(JSON.parse(e.data)));
+    source.addEventListener('name', e => handleServerCode(JSON.parse(e.data)));
+    source.addEventListener('stats', e => applyStatsEvent(JSON.parse(e.data)));
+    source.onerror = () => {
+        // EventSource reconnects by itself; it only gives up when the server refuses the stream
+        if (source.readyState === EventSource.CLOSED) {
+            console.warn("Canal de eventos no disponible, usando sondeo (polling)");
+            startPolling();
+        }
+    };
+}
+
+// Fallback: poll the compatibility endpoint
+function startPolling() {
+    setInterval(async () => {
+        if (isModalOpen) return;
+
+        try {
+            const response = await fetch('/api/latest_codes');
+            const codes = await response.json();
+
+            for (const codeObj of codes || []) {
+                await handleServerCode(codeObj);
             }
+        } catch (e) {
+            console.error("Error de sondeo (polling):", e);
         }
-    } catch (e) {
-        console.error("Error de sondeo (polling):", e);
-    }
-}, 500);
+    }, 500);
+}
+
+connectEvents();
 
 async function saveCode(codeObj) {
     try {
@@ -183,7 +266,7 @@ async function saveCode(codeObj) {
         });
         const savedCode = await res.json();
 
-        allCodes.unshift(savedCode);
+        addSavedCode(savedCode);
         scannedCodes.add(codeObj.data);
 
         filterAndRender();
@@ -194,6 +277,25 @@ async function saveCode(codeObj) {
     }
 }
 
+function addSavedCode(savedCode) {
+    // The "stats" event of our own save may arrive before the POST response
+    if (allCodes.some(c => c.id === savedCode.id)) return;
+    allCodes.unshift(savedCode);
+    scannedCodes.add(savedCode.data);
+}
+
+function removeLocalCode(id) {
+    const index = allCodes.findIndex(c => c.id === id);
+    if (index !== -1) {
+        // Check if it's the last one of its kind before removing from Set
+        const dataVal = allCodes[index].data;
+        allCodes.splice(index, 1);
+        if (!allCodes.some(c => c.data === dataVal)) {
+            scannedCodes.delete(dataVal);
+        }
+    }
+}
+
 async function fetchCodes() {
     try {
         const res = await fetch('/api/codes');
@@ -272,15 +374,7 @@ window.deleteCode = async (id) => {
         await fetch(`/api/codes/${id}`, { method: 'DELETE' });
 
         // Update local state
-        const index = allCodes.findIndex(c => c.id === id);
-        if (index !== -1) {
-            // Check if it's the last one of its kind before removing from Set
-            const dataVal = allCodes[index].data;
-            allCodes.splice(index, 1);
-            if (!allCodes.some(c => c.data === dataVal)) {
-                scannedCodes.delete(dataVal);
-            }
-        }
+        removeLocalCode(id);
 
         filterAndRender();
         updateStats();
@@ -359,9 +453,9 @@ btnContinueClient.addEventListener('click', () => {
 });
 
 btnNewClient.addEventListener('click', async () => {
-    // 1. Clear Database
+    // 1. Close the sale (logged to the sales ledger and cleared in one step)
     try {
-        await fetch('/api/codes/all', { method: 'DELETE' });
+        await fetch('/api/sales/close', { method: 'POST' });
 
         // 2. Clear Local State
         allCodes = [];
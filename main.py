@@ -1,21 +1,39 @@
-from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Depends, UploadFile, File
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, Response, FileResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.exception_handlers import http_exception_handler
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-import cv2
-import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import asyncio
+import csv
+import tempfile
 import threading
+import time
 
 from backend.vision.camera import VideoProcessor
 from backend.vision.detector import BarcodeDetector
+from backend.vision.tracker import DetectionTracker
+from backend.vision.pipeline import Lane
+from backend.vision.broadcaster import FrameBroadcaster
+from backend.vision.decode_pool import DecodePool
 from backend.service import BarcodeService
+from backend.name_cache import ProductNameCache
+from backend.resolver import NameResolver
+from backend.catalog import CatalogIndex
+from backend.dedup import DedupStore
+from backend.events import EventBus, format_sse
+from backend.profiler import SamplingProfiler, slow_frames
+from backend import config, metrics
 from backend.schemas import ErrorResponse, ScannedCodeCreate, ScannedCodeResponse
 from backend.database import models, crud, database
+from backend.database.writer import ScanWriter
 
-# Initialize Database Tables
-models.Base.metadata.create_all(bind=database.engine)
+# Importing this module has no side effects: the database is initialized and
+# the cameras are opened at startup. The decode pool's worker processes are
+# spawned, and with `python main.py` each of them re-imports this module.
 
 app = FastAPI()
 
@@ -34,159 +52,462 @@ app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 templates = Jinja2Templates(directory="frontend/templates")
 
 # Initialize global singletons
-video_stream = VideoProcessor(src=0)
-barcode_detector = BarcodeDetector()
-barcode_service = BarcodeService()
-detected_codes_buffer = []
+events = EventBus(max_queue=config.EVENT_QUEUE_SIZE)
+scan_writer = ScanWriter(max_batch=config.WRITE_BATCH_SIZE,
+                         flush_interval=config.WRITE_FLUSH_INTERVAL)
+name_cache = ProductNameCache(max_entries=config.NAME_CACHE_SIZE,
+                              ttl=config.NAME_CACHE_TTL,
+                              negative_ttl=config.NAME_CACHE_NEGATIVE_TTL)
+catalog = CatalogIndex(refresh_interval=config.CATALOG_REFRESH_INTERVAL)
 
-@app.on_event("startup")
-def startup_event():
-    try:
-        video_stream.start()
-    except Exception as e:
-        print(f"Failed to start camera: {e}")
+def on_name_resolved(code, name):
+    """Pushes a late product name to the clients of the lane that scanned it."""
+    lane = lanes.get(code.get('lane')) or default_lane
+    lane.bus.publish_update(dict(code, event="name", product_name=name, resolving=False))
 
-@app.on_event("shutdown")
-def shutdown_event():
-    video_stream.stop()
+barcode_service = BarcodeService(name_cache=name_cache,
+                                 resolver=NameResolver(timeout=config.NAME_LOOKUP_TIMEOUT,
+                                                       max_workers=config.NAME_LOOKUP_WORKERS),
+                                 on_name_resolved=on_name_resolved,
+                                 dedup=DedupStore(interval=config.DEDUP_INTERVAL,
+                                                  max_entries=config.DEDUP_MAX_ENTRIES,
+                                                  confirm_frames=config.DEDUP_CONFIRM_FRAMES,
+                                                  per_source=bool(config.DEDUP_PER_LANE)))
+
+def process_detected_codes(codes, lane_id=None):
+    """Validates/dedups the codes of one decoded frame and attaches product info."""
+    for code in codes:
+        code['lane'] = lane_id
 
-def generate_frames():
-    """Video streaming generator function."""
-    while True:
+    def metadata_batch(barcodes):
+        # Only frames with new codes open a session (one query for all of them)
+        db = database.SessionLocal()
         try:
-            frame = video_stream.read()
-            if frame is None:
-                time.sleep(0.01)
+            return crud.get_barcode_metadata_batch(db, barcodes, catalog=catalog)
+        finally:
+            db.close()
+
+    return barcode_service.process_frame_codes(codes, db_metadata_batch_func=metadata_batch)
+
+def make_tracker():
+    if config.TRACK_CONFIRM_READS <= 0:
+        return None
+    return DetectionTracker(confirm_reads=config.TRACK_CONFIRM_READS,
+                            full_every=config.TRACK_FULL_EVERY,
+                            region_every=config.TRACK_REGION_EVERY)
+
+def make_detector():
+    return BarcodeDetector(budget_ms=config.DECODE_BUDGET_MS,
+                           use_gate=bool(config.DECODE_GATE),
+                           use_opencv_localizer=bool(config.OPENCV_LOCALIZER),
+                           tracker=make_tracker())
+
+lanes = {}
+default_lane = None
+decode_pool = None
+
+def build_lanes():
+    """
+    One lane per configured camera; the first one is the default /video_feed.
+    Decoding and streaming run at independent rates in their own threads.
+    """
+    global default_lane, decode_pool
+    for lane_id, src in config.CAMERAS:
+        video = VideoProcessor(src=src, name=lane_id,
+                               width=config.CAPTURE_WIDTH, height=config.CAPTURE_HEIGHT,
+                               fps=config.CAPTURE_FPS, fourcc=config.CAPTURE_FOURCC,
+                               backend=config.CAPTURE_BACKEND, loop=bool(config.CAPTURE_LOOP))
+        lanes[lane_id] = Lane(lane_id, video,
+                              FrameBroadcaster(jpeg_quality=config.JPEG_QUALITY,
+                                               max_width=config.STREAM_MAX_WIDTH,
+                                               name=lane_id),
+                              stream_fps=config.STREAM_FPS,
+                              overlay_ttl=config.OVERLAY_TTL,
+                              events=events)
+    default_lane = next(iter(lanes.values()))
+
+    if config.DECODE_WORKERS > 0:
+        # Decode all cameras in a pool of worker processes
+        decode_pool = DecodePool(list(lanes.values()), workers=config.DECODE_WORKERS,
+                                 process_codes=process_detected_codes,
+                                 decode_fps=config.DECODE_FPS,
+                                 budget_ms=config.DECODE_BUDGET_MS,
+                                 use_opencv_localizer=bool(config.OPENCV_LOCALIZER),
+                                 use_gate=bool(config.DECODE_GATE),
+                                 make_tracker=make_tracker,
+                                 on_failure=decode_in_threads)
+    else:
+        for lane in lanes.values():
+            lane.attach_detector(make_detector(), process_codes=process_detected_codes,
+                                 decode_fps=config.DECODE_FPS)
+
+def decode_in_threads():
+    """Fallback when the decode pool keeps crashing: one detection thread per lane."""
+    print("[ERROR] Decode pool stopped, decoding in threads instead")
+    for lane in lanes.values():
+        lane.attach_detector(make_detector(), process_codes=process_detected_codes,
+                             decode_fps=config.DECODE_FPS)
+        lane.worker.start()
+
+def get_lane(lane_id=None):
+    if lane_id is None:
+        return default_lane
+    lane = lanes.get(lane_id)
+    if lane is None:
+        raise HTTPException(status_code=404, detail=f"Unknown lane: {lane_id}")
+    return lane
+
+def generate_frames(lane, subscriber):
+    """Video streaming generator function. Only forwards the already encoded frames."""
+    try:
+        while True:
+            frame_bytes = subscriber.next_frame(timeout=1.0)
+            if frame_bytes is None:
                 continue
-            
-            # Process frame
-            processed_frame, codes = barcode_detector.detect(frame)
-            
-            # Use Service to Validate/Dedup
-            global detected_codes_buffer
-            if codes:
-                # Use a fresh DB session for the background thread
-                db = database.SessionLocal()
-                try:
-                    def metadata_helper(barcode):
-                        return crud.get_barcode_metadata(db, barcode)
-                    
-                    unique_codes = barcode_service.process_frame_codes(codes, db_metadata_func=metadata_helper)
-                    new_codes = [c for c in unique_codes if c.get('is_new')]
-                    if new_codes:
-                        detected_codes_buffer.extend(new_codes)
-                finally:
-                    db.close()
-            
-            # Encode
-            ret, buffer = cv2.imencode('.jpg', processed_frame)
-            if not ret: continue
-            frame_bytes = buffer.tobytes()
-            
+
+            # Resumes once the server has handed the frame to the client socket
+            t0 = time.perf_counter()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Stream error: {e}")
-            time.sleep(1)
+            metrics.STREAM_SEND_SECONDS.observe(time.perf_counter() - t0, lane.lane_id)
+            metrics.STREAM_FRAMES.inc(lane.lane_id)
+    finally:
+        # Stops counting as a viewer (the renderer only encodes while there are any)
+        subscriber.close()
+
+def generate_events(subscriber):
+    """Server-Sent Events generator: scans, late product names and stats deltas."""
+    with subscriber:
+        yield "retry: 2000\n\n"
+        while not subscriber.closed:
+            batch = subscriber.next_events(timeout=15.0)
+            if not batch:
+                # Comment line: keeps proxies from closing the idle connection
+                # and lets us notice clients that went away
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                yield format_sse(event)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/video_feed")
-async def video_feed():
-    return StreamingResponse(generate_frames(), 
-                            media_type="multipart/x-mixed-replace; boundary=frame")
+async def video_feed(lane: str = None):
+    lane = get_lane(lane)
+    subscriber = lane.broadcaster.subscribe()
+    # Also closed after a disconnect, where the generator may never be resumed
+    return StreamingResponse(generate_frames(lane, subscriber),
+                             media_type="multipart/x-mixed-replace; boundary=frame",
+                             background=BackgroundTask(subscriber.close))
+
+@app.get("/api/events")
+async def event_stream(lane: str = None):
+    subscriber = events.subscribe(lanes=[get_lane(lane).lane_id] if lane else None)
+    # Also closed after a disconnect, where the generator may never be resumed
+    return StreamingResponse(generate_events(subscriber), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(subscriber.close))
 
+# Compatibility shim for clients that still poll instead of using /api/events
 @app.get("/api/latest_codes", response_model=list)
-async def get_latest_codes():
-    global detected_codes_buffer
-    codes = detected_codes_buffer
-    detected_codes_buffer = [] 
+async def get_latest_codes(lane: str = None):
+    selected = [get_lane(lane)] if lane else lanes.values()
+    codes = []
+    for l in selected:
+        codes.extend(l.bus.drain_new_codes())
     return JSONResponse(content=codes)
 
+@app.get("/api/lanes")
+async def get_lanes():
+    return JSONResponse(content=list(lanes.keys()))
+
 # Database Endpoints
 
+def serialize_code(code):
+    return {
+        'id': code.id,
+        'data': code.data,
+        'type': code.type,
+        'product_name': code.product_name,
+        'price': code.price,
+        'timestamp': code.timestamp.isoformat() if code.timestamp else None,
+    }
+
+# scan_id -> Future of the saved row. Every open tab gets each pushed scan, so
+# the same scan can be posted several times; it is stored only once.
+saved_scans = OrderedDict()
+
 @app.post("/api/codes", response_model=ScannedCodeResponse)
-async def create_code(code: ScannedCodeCreate, db: Session = Depends(database.get_db)):
-    return crud.create_code(db=db, code=code)
+async def create_code(code: ScannedCodeCreate):
+    future = saved_scans.get(code.scan_id) if code.scan_id is not None else None
+    first = future is None
+    if first:
+        # Batched with the other scans of the burst; answered once committed
+        future = scan_writer.submit(code)
+        if code.scan_id is not None:
+            saved_scans[code.scan_id] = future
+            while len(saved_scans) > 1000:
+                saved_scans.popitem(last=False)
+
+    try:
+        db_code = await asyncio.wrap_future(future)
+    except Exception:
+        saved_scans.pop(code.scan_id, None)
+        raise
+
+    if first:
+        events.publish("stats", {"action": "created", "total_delta": 1,
+                                 "code": serialize_code(db_code)})
+    return db_code
 
 @app.get("/api/codes", response_model=list[ScannedCodeResponse])
-async def read_codes(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    codes = crud.get_codes(db, skip=skip, limit=limit)
+async def read_codes(response: Response, skip: int = 0, limit: int = 100, cursor: str = None,
+                     db: Session = Depends(database.get_db)):
+    if skip:
+        # Legacy offset pagination
+        return crud.get_codes(db, skip=skip, limit=limit)
+
+    # Keyset pagination: pass X-Next-Cursor back as ?cursor= for the next page
+    try:
+        codes, next_cursor = crud.get_codes_page(db, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return codes
 
 from backend.sales_tracker import SalesTracker
+from backend.reports import ReportWorker
+
+sales_tracker = SalesTracker()
+report_worker = ReportWorker(sales_tracker)
+
+async def close_current_sale():
+    """
+    Snapshots the basket into the sales ledger and empties it in one
+    transaction, on the writer thread, so it is ordered with the scans saved
+    before it and no till's sale is lost or logged twice. The PDF receipt is
+    built afterwards by the report worker.
+    """
+    sale = await asyncio.wrap_future(scan_writer.run(sales_tracker.close_sale))
+    if sale is None:
+        return None
+
+    report_worker.submit(sale.id)
+    events.publish("stats", {"action": "cleared", "total_delta": -sale.item_count, "sale_id": sale.id})
+    return sale
+
+@app.post("/api/sales/close")
+async def close_sale():
+    sale = await close_current_sale()
+    if sale is None:
+        return {"status": "empty", "sale_id": None}
+    return {"status": "success", "sale_id": sale.id, "item_count": sale.item_count, "total": sale.total}
 
 @app.delete("/api/codes/all")
-async def delete_all_codes(db: Session = Depends(database.get_db)):
-    # 1. Fetch current codes for sales log
-    codes = crud.get_codes(db, limit=10000)
-    
-    # 2. Log to Excel
-    if codes:
-        SalesTracker().log_sale(codes)
-        
-    # 3. Clear database
-    crud.delete_all_codes(db)
+async def delete_all_codes():
+    # Same as closing the sale: the basket is logged before it is cleared
+    await close_current_sale()
     return {"status": "success"}
 
+@app.get("/api/sales")
+async def list_sales(limit: int = 50, db: Session = Depends(database.get_db)):
+    sales = db.query(models.Sale).order_by(models.Sale.id.desc()).limit(limit).all()
+    return JSONResponse(content=[{
+        "id": sale.id,
+        "closed_at": sale.closed_at.isoformat(),
+        "item_count": sale.item_count,
+        "total": sale.total,
+        "report_ready": os.path.exists(report_worker.pdf_path(sale.id)),
+    } for sale in sales])
+
+@app.get("/api/sales/{sale_id}/pdf")
+async def get_sale_pdf(sale_id: int):
+    path = report_worker.pdf_path(sale_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Report not found (or not built yet)")
+    return FileResponse(path, media_type="application/pdf", filename=f"venta_{sale_id}.pdf")
+
 @app.delete("/api/codes/{code_id}")
 async def delete_code(code_id: int, db: Session = Depends(database.get_db)):
     success = crud.delete_code(db, code_id)
     if not success:
         raise HTTPException(status_code=404, detail="Code not found")
+    events.publish("stats", {"action": "deleted", "id": code_id, "total_delta": -1})
     return {"status": "success"}
 
 @app.get("/api/stats/hourly")
 async def get_hourly_stats(db: Session = Depends(database.get_db)):
-    # Simple hourly grouping for today
-    today = time.strftime("%Y-%m-%d")
-    scans = db.query(models.ScannedCode).filter(models.ScannedCode.timestamp.like(f"{today}%")).all()
-    
-    hourly = [0] * 24
-    for s in scans:
-        try:
-            # Assumes ISO format from SQLite
-            hour = int(s.timestamp.split("T")[1].split(":")[0])
-            hourly[hour] += 1
-        except:
-            continue
+    # Today hour by hour, the dashboard chart (see /api/stats/scans for other ranges)
+    today = datetime.combine(date.today(), datetime.min.time())
+    _, hourly = crud.get_scan_histogram(db, today, today + timedelta(days=1), "hour")
     return JSONResponse(content={"labels": [f"{h:02d}:00" for h in range(24)], "data": hourly})
 
+@app.get("/api/stats/scans")
+async def get_scan_stats(start: datetime = None, end: datetime = None, granularity: str = "hour",
+                         rollup: bool = True, db: Session = Depends(database.get_db)):
+    """Scans per minute/hour/day/week in [start, end); defaults to today."""
+    if start is None:
+        start = datetime.combine(date.today(), datetime.min.time())
+    if end is None:
+        end = start + timedelta(days=1)
+    try:
+        labels, data = crud.get_scan_histogram(db, start, end, granularity, use_rollup=rollup)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content={
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "labels": labels,
+        "data": data,
+    })
+
+@app.get("/api/stats/detector")
+async def get_detector_stats():
+    if decode_pool is not None and not decode_pool.failed:
+        return JSONResponse(content=decode_pool.get_stats())
+    return JSONResponse(content={lane_id: lane.detector.get_stats() for lane_id, lane in lanes.items()})
+
+@app.get("/api/stats/capture")
+async def get_capture_stats():
+    # Resolution, frame rate and format each camera actually delivers
+    return JSONResponse(content={lane_id: lane.video.get_info() for lane_id, lane in lanes.items()})
+
+@app.get("/api/stats/cache")
+async def get_cache_stats():
+    return JSONResponse(content=name_cache.get_stats())
+
+@app.get("/api/stats/dedup")
+async def get_dedup_stats():
+    return JSONResponse(content=barcode_service.dedup.get_stats())
+
+@app.get("/api/stats/catalog")
+async def get_catalog_stats():
+    return JSONResponse(content=catalog.get_stats())
+
+@app.get("/api/stats/writer")
+async def get_writer_stats():
+    return JSONResponse(content=scan_writer.get_stats())
+
+@app.get("/api/stats/reports")
+async def get_report_stats():
+    return JSONResponse(content=report_worker.get_stats())
+
+@app.get("/api/stats/events")
+async def get_event_stats():
+    return JSONResponse(content=events.stats())
+
 # Re-initialize DB if needed (migration hack for dev)
-# models.Base.metadata.create_all(bind=database.engine) is already at top.
-# But it won't add columns.
+# models.init_db(database.engine) runs at startup.
+# It adds missing tables, indexes and triggers, and the products.version column.
 
 # Export Endpoints
-from fastapi.responses import Response
-from backend.database import backup
+from backend.database import backup, catalog_io
+
+# Exports are streamed in chunks, each generator reads with its own session
 
 @app.get("/api/export/csv")
-async def export_csv(db: Session = Depends(database.get_db)):
-    csv_content = backup.export_to_csv(db)
+async def export_csv():
     timestamp = time.strftime("%Y%m%d-%H%M%S")
-    return Response(
-        content=csv_content,
+    return StreamingResponse(
+        backup.iter_csv(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=codes_{timestamp}.csv"}
     )
 
 @app.get("/api/export/json")
-async def export_json(db: Session = Depends(database.get_db)):
-    data = backup.export_to_json(db)
+async def export_json():
     timestamp = time.strftime("%Y%m%d-%H%M%S")
-    return JSONResponse(
-        content=data,
+    return StreamingResponse(
+        backup.iter_json(),
+        media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename=codes_{timestamp}.json"}
     )
 
+@app.get("/api/export/ndjson")
+async def export_ndjson():
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        backup.iter_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=codes_{timestamp}.ndjson"}
+    )
+
+@app.post("/api/products/import")
+def import_products(file: UploadFile = File(...), format: str = None, validate: bool = True,
+                    update: bool = True):
+    """
+    Bulk upsert of a catalog file (CSV with barcode,name,price columns, JSON
+    array or NDJSON). Progress is pushed as "catalog" events on /api/events.
+    """
+    fmt = format or catalog_io.detect_format(file.filename)
+    if fmt not in catalog_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}'")
+
+    def progress(stats):
+        events.publish("catalog", {"action": "importing", "read": stats["read"],
+                                   "imported": stats["imported"], "invalid": stats["invalid"]})
+
+    start = time.perf_counter()
+    try:
+        # Sync endpoint: the upload is parsed and written in a worker thread
+        stats = catalog_io.import_products(catalog_io.iter_products(file.file, fmt), validate=validate,
+                                           update_existing=update, progress=progress)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid catalog file: {e}")
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+
+    # Lookups see the new products right away, not at the next poll
+    catalog.refresh()
+    events.publish("catalog", dict(stats, action="imported"))
+    print(f"[INFO] Catalog import: {stats['imported']} of {stats['read']} products in {stats['seconds']} s")
+    return JSONResponse(content=stats)
+
+@app.get("/api/products/export")
+async def export_products(format: str = "csv"):
+    if format not in catalog_io.EXPORTERS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}'")
+    iter_chunks, media_type = catalog_io.EXPORTERS[format]
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        iter_chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=products_{timestamp}.{format}"}
+    )
+
+@app.get("/api/export/sales")
+def export_sales(start: datetime = None, end: datetime = None):
+    """Sales ledger of [start, end) as an Excel workbook, generated on demand."""
+    # Sync endpoint: FastAPI runs it in a worker thread, off the event loop
+    tmp = tempfile.TemporaryFile()
+    try:
+        sales_tracker.export_xlsx(tmp, start=start, end=end)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+
+    def stream():
+        with tmp:
+            while chunk := tmp.read(64 * 1024):
+                yield chunk
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        stream(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=ventas_{timestamp}.xlsx"}
+    )
+
 from backend.pdf_generator import PDFGenerator
 
 @app.get("/api/export/pdf")
 async def export_pdf(db: Session = Depends(database.get_db)):
-    codes = crud.get_codes(db, limit=10000) # Fetch all codes
-    pdf_bytes = PDFGenerator().generate(codes)
+    # One row per product, aggregated by SQLite
+    pdf_bytes = PDFGenerator().generate(items=crud.get_code_summary(db))
     
     timestamp = time.strftime("%Y%m%d-%H%M")
     return Response(
@@ -195,35 +516,118 @@ async def export_pdf(db: Session = Depends(database.get_db)):
         headers={"Content-Disposition": f"attachment; filename=lista_compra_{timestamp}.pdf"}
     )
 
-import shutil
 import os
 
-# Automatic Backup
-def backup_loop():
-    while True:
-        try:
-            time.sleep(600) # Backup every 10 minutes
-            if os.path.exists("barcodes.db"):
-                timestamp = time.strftime("%Y%m%d-%H%M%S")
-                backup_path = f"backups/barcodes_{timestamp}.db"
-                shutil.copy2("barcodes.db", backup_path)
-                print(f"[INFO] Automatic backup created: {backup_path}")
-        except Exception as e:
-            print(f"[ERROR] Backup failed: {e}")
+# Automatic Backup (online snapshots, see BackupManager)
+backup_manager = backup.BackupManager(backup_dir=config.BACKUP_DIR,
+                                      interval=config.BACKUP_INTERVAL,
+                                      keep_hours=config.BACKUP_KEEP_HOURS,
+                                      keep_days=config.BACKUP_KEEP_DAYS)
+
+@app.get("/api/stats/backup")
+async def get_backup_stats():
+    return JSONResponse(content=backup_manager.get_stats())
+
+# Component counters are read at scrape time; the stage histograms are fed as work happens
+for name, get_stats in (("writer", scan_writer.get_stats), ("reports", report_worker.get_stats),
+                        ("cache", name_cache.get_stats), ("catalog", catalog.get_stats),
+                        ("dedup", barcode_service.dedup.get_stats), ("backup", backup_manager.get_stats)):
+    metrics.registry.add_collector(metrics.stats_collector(name, get_stats))
+
+def collect_stream_stats():
+    samples = {"events_published": [({}, events.published)],
+               "event_subscribers": [({}, len(events.stats()["subscribers"]))],
+               "stream_subscribers": [], "stream_frames_encoded": [], "stream_frames_dropped": []}
+    for lane_id, lane in lanes.items():
+        stats = lane.broadcaster.stats()
+        samples["stream_subscribers"].append(({"lane": lane_id}, stats["subscribers"]))
+        samples["stream_frames_encoded"].append(({"lane": lane_id}, stats["frames_encoded"]))
+        samples["stream_frames_dropped"].append(({"lane": lane_id}, stats["frames_dropped"]))
+    if decode_pool is not None:
+        for key in ("submitted", "decoded", "dropped", "inflight"):
+            samples[f"pool_frames_{key}"] = [({"lane": lane_id}, value[key])
+                                            for lane_id, value in decode_pool.get_stats()["lanes"].items()]
+    return [(f"scanner_{name}", "gauge", name.replace("_", " "), values) for name, values in samples.items()]
+
+metrics.registry.add_collector(collect_stream_stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format: per-stage latency histograms, error counters and component stats."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Diagnostics (opt-in): sampling profiler and slow-frame log
+profiler = SamplingProfiler()
+slow_frames.threshold = config.SLOW_FRAME_MS / 1000.0
+
+@app.get("/admin/threads")
+def list_threads():
+    """Thread names, to pick the `threads` filter of /admin/profile."""
+    if not config.PROFILER:
+        raise HTTPException(status_code=403, detail="Profiler disabled (set SCANNER_PROFILER=1)")
+    return JSONResponse(content=sorted(t.name for t in threading.enumerate()))
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+def run_profile(seconds: float = 10.0, interval_ms: float = 20.0, threads: str = None, match: str = None):
+    """
+    Samples every thread (or those whose name contains one of the
+    comma-separated `threads`) for `seconds` and returns collapsed stacks,
+    ready for flamegraph.pl or speedscope. E.g. threads=capture,stream-renderer
+    or match=generate_frames.
+    """
+    if not config.PROFILER:
+        raise HTTPException(status_code=403, detail="Profiler disabled (set SCANNER_PROFILER=1)")
+    names = [t.strip() for t in threads.split(",") if t.strip()] if threads else None
+    # Sync endpoint: sampling runs in a worker thread, the event loop keeps serving
+    stacks = profiler.profile(seconds=seconds, interval=interval_ms / 1000.0, threads=names, match=match)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    print(f"[INFO] Profile done: {profiler.last_run['samples']} samples, {profiler.last_run['stacks']} stacks")
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return PlainTextResponse(stacks, headers={
+        "Content-Disposition": f"attachment; filename=profile_{timestamp}.folded"})
+
+@app.get("/admin/slow_frames")
+async def get_slow_frames(lane: str = None):
+    if not config.PROFILER:
+        raise HTTPException(status_code=403, detail="Profiler disabled (set SCANNER_PROFILER=1)")
+    return JSONResponse(content={"threshold_ms": slow_frames.threshold * 1000,
+                                 "recorded": slow_frames.recorded,
+                                 "frames": slow_frames.entries(lane)})
 
 @app.on_event("startup")
 def startup_event():
+    # Initialize Database Tables (plus indexes/aggregates missing from older databases)
+    models.init_db(database.engine)
+    build_lanes()
+    catalog.start()
+    scan_writer.start()
+    report_worker.start()
+    # Sales logged to sales.xlsx before the ledger existed
+    if os.path.exists("sales.xlsx") and not sales_tracker.has_sales():
+        sales_tracker.import_workbook("sales.xlsx")
     try:
-        video_stream.start()
+        for lane in lanes.values():
+            lane.start()
+        if decode_pool is not None:
+            decode_pool.start()
         # Start backup thread
-        backup_thread = threading.Thread(target=backup_loop, daemon=True)
-        backup_thread.start()
+        backup_manager.start()
     except Exception as e:
         print(f"Failed to start camera or backup: {e}")
 
 @app.on_event("shutdown")
 def shutdown_event():
-    video_stream.stop()
+    barcode_service.resolver.shutdown()
+    catalog.stop()
+    if decode_pool is not None:
+        decode_pool.stop()
+    for lane in lanes.values():
+        lane.stop()
+    # Commit every scan that was already acknowledged
+    scan_writer.stop()
+    report_worker.stop()
+    backup_manager.stop()
 
 if __name__ == "__main__":
     import uvicorn
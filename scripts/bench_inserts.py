@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import crud, database, models
+from backend.database.writer import ScanWriter
+from backend.schemas import ScannedCodeCreate
+
+def make_session_factory(path, pragmas):
+    engine = database.make_engine(f"sqlite:///{path}", pragmas=pragmas)
+    models.init_db(engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_code(i):
+    return ScannedCodeCreate(data=f"{8400000000000 + i % 500}", type="EAN13",
+                             product_name=f"Producto {i % 500}", price=1.0)
+
+def run_clients(scans, clients, save):
+    """`clients` threads each save their share of scans one by one, like HTTP requests."""
+    def client(indexes):
+        for i in indexes:
+            save(make_code(i))
+
+    threads = [threading.Thread(target=client, args=(range(c, scans, clients),)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_per_row(path, scans, clients):
+    """Before: default journal, one commit + refresh per scan."""
+    engine, session_factory = make_session_factory(path, pragmas=None)
+    lock = threading.Lock()  # One SQLite writer at a time, as the server effectively had
+
+    def save(code):
+        db = session_factory()
+        try:
+            with lock:
+                crud.create_code(db, code)
+        finally:
+            db.close()
+
+    elapsed = run_clients(scans, clients, save)
+    engine.dispose()
+    return elapsed
+
+def bench_write_behind(path, scans, clients, max_batch, flush_interval):
+    """After: WAL + tuned pragmas, scans grouped by the ScanWriter."""
+    engine, session_factory = make_session_factory(path, pragmas=database.SQLITE_PRAGMAS)
+    writer = ScanWriter(session_factory=session_factory, max_batch=max_batch,
+                        flush_interval=flush_interval).start()
+
+    elapsed = run_clients(scans, clients, lambda code: writer.submit(code).result())
+    writer.stop()
+    engine.dispose()
+    return elapsed, writer.get_stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row commits with the write-behind scan writer.")
+    parser.add_argument("--scans", type=int, default=2000, help="Scans to insert in each run")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients saving scans")
+    parser.add_argument("--batch", type=int, default=200, help="ScanWriter max_batch")
+    parser.add_argument("--interval", type=float, default=0.0, help="ScanWriter flush_interval (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = bench_per_row(os.path.join(tmp, "before.db"), args.scans, args.clients)
+        after, stats = bench_write_behind(os.path.join(tmp, "after.db"), args.scans, args.clients,
+                                          args.batch, args.interval)
+
+    print(f"Scans: {args.scans}, clients: {args.clients}")
+    print(f"Per-row commits (default journal): {args.scans / before:10.0f} inserts/s  ({before:.2f} s)")
+    print(f"Write-behind (WAL):                {args.scans / after:10.0f} inserts/s  ({after:.2f} s)")
+    print(f"Batches: {stats['batches']}, largest: {stats['max_batch_seen']}, speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import sys
+import time
+
+from backend.database import catalog_io, database, models
+
+def import_file(path, fmt=None, batch_size=5000, validate=True, update_existing=True):
+    fmt = fmt or catalog_io.detect_format(path)
+    start = time.perf_counter()
+
+    def progress(stats):
+        elapsed = time.perf_counter() - start
+        print(f"\r{stats['read']} read, {stats['imported']} imported, {stats['invalid']} invalid "
+              f"({stats['read'] / max(elapsed, 1e-9):.0f} rows/s)", end="", flush=True)
+
+    with open(path, "rb") as f:
+        stats = catalog_io.import_products(catalog_io.iter_products(f, fmt), batch_size=batch_size,
+                                           validate=validate, update_existing=update_existing,
+                                           progress=progress)
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"Imported {stats['imported']} of {stats['read']} products in {elapsed:.2f} s")
+    if stats["invalid"]:
+        print(f"Skipped {stats['invalid']} with an invalid barcode, e.g. {', '.join(stats['invalid_samples'])}")
+    return stats
+
+def export_file(path, fmt=None):
+    fmt = fmt or catalog_io.detect_format(path)
+    iter_chunks, _ = catalog_io.EXPORTERS[fmt]
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        for chunk in iter_chunks():
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of the product catalog (CSV, JSON, NDJSON).")
+    parser.add_argument("path", help="Catalog file (with --export, '-' writes to stdout)")
+    parser.add_argument("--export", action="store_true", help="Write the catalog instead of importing it")
+    parser.add_argument("--format", choices=catalog_io.FORMATS, help="File format (default: from the extension)")
+    parser.add_argument("--batch", type=int, default=5000, help="Rows per transaction")
+    parser.add_argument("--no-validate", action="store_true", help="Accept EAN/UPC codes with a wrong check digit")
+    parser.add_argument("--keep-existing", action="store_true", help="Do not update products that already exist")
+    args = parser.parse_args()
+
+    models.init_db(database.engine)
+    if args.export:
+        export_file(args.path, args.format)
+    else:
+        import_file(args.path, args.format, batch_size=args.batch, validate=not args.no_validate,
+                    update_existing=not args.keep_existing)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
-from sqlalchemy.orm import Session
-from backend.database import database, models, crud
+from backend.database import catalog_io, database, models
 
 def populate_products():
-    db = database.SessionLocal()
-    
     # User's list with names and barcodes. All prices are 1.0.
     products_data = [
         ("Leche (en brick)", "0539099943917"),
@@ -34,19 +31,12 @@ def populate_products():
     # I used the barcodes provided in the text.
     
     print("Populating products...")
-    for name, barcode in products_data:
-        # Check if exists
-        existing = crud.get_product_by_barcode(db, barcode)
-        if not existing:
-            print(f"Adding {name} ({barcode})")
-            crud.create_product(db, models.Product(name=name, barcode=barcode, price=1.0))
-        else:
-            print(f"Skipping {name} ({barcode}) - Already exists")
-            
-    db.close()
-    print("Done.")
+    # Products that already exist keep their current name and price
+    stats = catalog_io.import_products(((barcode, name, 1.0) for name, barcode in products_data),
+                                       update_existing=False)
+    print(f"Done. {stats['read']} products checked.")
 
 if __name__ == "__main__":
     # Ensure tables exist
-    models.Base.metadata.create_all(bind=database.engine)
+    models.init_db(database.engine)
     populate_products()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import database, models
+from backend.database.catalog_io import import_products, valid_check_digits
+
+# barcode -> expected result of valid_check_digits
+CHECK_DIGIT_CASES = {
+    "4006381333931": True,    # EAN-13
+    "4006381333932": False,   # EAN-13, wrong check digit
+    "036000291452": True,     # UPC-A
+    "036000291453": False,    # UPC-A, wrong check digit
+    "96385074": True,         # EAN-8
+    "96385070": False,        # EAN-8, wrong check digit
+    "ABC123456789": True,     # Non-numeric, 12 chars: internal code
+    "12345": True,            # Not a GTIN length: internal code
+    "": False,                # Empty
+}
+
+def verify_check_digits():
+    barcodes = list(CHECK_DIGIT_CASES)
+    result = valid_check_digits(barcodes)
+    wrong = [b for b, ok in zip(barcodes, result) if bool(ok) != CHECK_DIGIT_CASES[b]]
+    if wrong:
+        print(f"FAILURE: Wrong check digit verdict for {wrong}")
+    else:
+        print(f"SUCCESS: Check digits verified ({len(barcodes)} cases).")
+
+def verify_partial_import():
+    # Throwaway database, so the real catalog is not touched
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = database.make_engine(f"sqlite:///{path}")
+    models.init_db(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    try:
+        import_products([("4006381333931", "Lapices", 2.5)], session_factory=session_factory)
+        # A price-only file must keep the name, a name-only file must keep the price
+        import_products([("4006381333931", None, 3.0)], session_factory=session_factory)
+        import_products([("4006381333931", "Lapices (caja)", None)], session_factory=session_factory)
+        # New product without a price gets the default
+        import_products([("96385074", "Goma", None)], session_factory=session_factory)
+
+        db = session_factory()
+        rows = {p.barcode: (p.name, p.price) for p in db.query(models.Product).all()}
+        db.close()
+
+        expected = {"4006381333931": ("Lapices (caja)", 3.0), "96385074": ("Goma", 1.0)}
+        if rows == expected:
+            print("SUCCESS: Partial imports only updated the columns present.")
+        else:
+            print(f"FAILURE: Expected {expected}, got {rows}")
+    finally:
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+if __name__ == "__main__":
+    verify_check_digits()
+    verify_partial_import()
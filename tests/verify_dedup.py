@@ -0,0 +1,66 @@
+from backend.dedup import DedupStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def check(label, got, expected):
+    if got == expected:
+        print(f"SUCCESS: {label}")
+    else:
+        print(f"FAILURE: {label} (expected {expected}, got {got})")
+
+def verify_ttl():
+    clock = FakeClock()
+    store = DedupStore(interval=5.0, clock=clock)
+    first = store.check("4006381333931", "lane-1")
+    clock.now = 4.9
+    repeated = store.check("4006381333931", "lane-1")
+    clock.now = 5.0
+    expired = store.check("4006381333931", "lane-1")
+    check("Code counted again only after the TTL", (first, repeated, expired), (True, False, True))
+    stats = store.get_stats()
+    check("TTL counters", (stats["duplicates"], stats["expired"]), (1, 1))
+
+def verify_max_entries():
+    clock = FakeClock()
+    store = DedupStore(interval=60.0, max_entries=3, clock=clock)
+    for i in range(5):
+        store.check(f"code-{i}", "lane-1")
+    check("Store bounded by max_entries", (len(store), store.get_stats()["evicted"]), (3, 2))
+    # The oldest codes were evicted, the newest are still remembered
+    check("Oldest entry evicted first", (store.check("code-0", "lane-1"), store.check("code-4", "lane-1")), (True, False))
+
+def verify_per_lane():
+    clock = FakeClock()
+    store = DedupStore(interval=5.0, clock=clock)
+    check("Same code on two lanes counts twice",
+          (store.check("96385074", "lane-1"), store.check("96385074", "lane-2")), (True, True))
+
+    shared = DedupStore(interval=5.0, per_source=False, clock=clock)
+    check("Same code on two lanes counts once without per_source",
+          (shared.check("96385074", "lane-1"), shared.check("96385074", "lane-2")), (True, False))
+
+def verify_confirmation():
+    clock = FakeClock()
+    store = DedupStore(interval=5.0, confirm_frames=3, confirm_gap=1.0, clock=clock)
+    reads = []
+    for _ in range(3):
+        reads.append(store.check("036000291452", "lane-1"))
+        clock.now += 0.1
+    check("Code accepted on the 3rd frame", reads, [False, False, True])
+
+    # A one-off misread, seen again after confirm_gap, starts over
+    store.check("036000291453", "lane-1")
+    clock.now += 2.0
+    check("Reads further apart than confirm_gap are not confirmed",
+          (store.check("036000291453", "lane-1"), store.check("036000291453", "lane-1")), (False, False))
+
+if __name__ == "__main__":
+    verify_ttl()
+    verify_max_entries()
+    verify_per_lane()
+    verify_confirmation()
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.database import database, models
+from backend.name_cache import ProductNameCache
+from backend.resolver import NameResolver
+from backend.service import BarcodeService
+
+# Fake OFF-family servers: (delay in seconds, product name or None[, HTTP status])
+FAKE_APIS = {
+    "food": (1.0, None),
+    "products": (0.3, "Galletas (paquete)"),
+    "beauty": (1.0, None),
+}
+
+def make_handler(delay, name, status=200):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            if name:
+                body = {"status": 1, "product": {"product_name": name}}
+            else:
+                body = {"status": 0}
+            data = json.dumps(body).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client already gave up (timeout case)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def start_servers(apis):
+    servers, urls = [], {}
+    for api_type, spec in apis.items():
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(*spec))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        urls[api_type] = f"http://127.0.0.1:{server.server_address[1]}"
+    return servers, urls
+
+def verify_name_resolver():
+    servers, urls = start_servers(FAKE_APIS)
+    resolver = NameResolver(base_urls=urls, timeout=2.0)
+    ok = True
+
+    # 1. All sources are asked at once: the answer arrives with the fast one
+    start = time.perf_counter()
+    name = resolver.resolve("8410000000001")
+    elapsed = time.perf_counter() - start
+    print(f"Resolved '{name}' in {elapsed:.2f}s")
+    if name != "Galletas (paquete)" or elapsed > 0.8:
+        print("FAILURE: Expected the fastest valid answer in well under the sequential 2.3s")
+        ok = False
+
+    # 2. resolve_async returns immediately and calls back later
+    done = threading.Event()
+    result = {}
+    def callback(barcode, name):
+        result[barcode] = name
+        done.set()
+
+    start = time.perf_counter()
+    resolver.resolve_async("8410000000002", callback)
+    returned = time.perf_counter() - start
+    done.wait(3.0)
+    print(f"resolve_async returned in {returned * 1000:.1f}ms, callback got {result}")
+    if returned > 0.05 or result.get("8410000000002") != "Galletas (paquete)":
+        print("FAILURE: resolve_async should not block and must report the name")
+        ok = False
+
+    resolver.shutdown()
+    for server in servers:
+        server.shutdown()
+
+    # 3. Nobody knows the code: None once every source answered
+    servers, urls = start_servers({"food": (0.1, None), "products": (0.1, None), "beauty": (0.1, None)})
+    resolver = NameResolver(base_urls=urls, timeout=2.0)
+    name = resolver.resolve("8410000000003")
+    print(f"Unknown code resolved to {name!r}")
+    if name is not None:
+        print("FAILURE: Expected None for an unknown code")
+        ok = False
+
+    resolver.shutdown()
+    for server in servers:
+        server.shutdown()
+
+    # 4. Every source fails (server error or timeout): FAILED, and nothing is cached
+    models.init_db(database.engine)
+    servers, urls = start_servers({"food": (0.0, None, 500), "products": (1.0, None), "beauty": (0.0, None, 503)})
+    resolver = NameResolver(base_urls=urls, timeout=0.3)
+    name = resolver.resolve("8410000000004")
+    print(f"Lookup with every source down resolved to {'FAILED' if name is NameResolver.FAILED else repr(name)}")
+    if name is not NameResolver.FAILED:
+        print("FAILURE: Expected NameResolver.FAILED when no source answers")
+        ok = False
+
+    cache = ProductNameCache()
+    service = BarcodeService(name_cache=cache, resolver=resolver)
+    name = service.get_product_name("8410000000005")
+    reported = threading.Event()
+    service.on_name_resolved = lambda code, name: reported.set()
+    service.resolve_name_async({"data": "8410000000006"})
+    reported.wait(3.0)
+    cached = [cache.get(barcode) for barcode in ("8410000000005", "8410000000006")]
+    if name != "Product Unknown" or not reported.is_set() or any(c is not ProductNameCache.MISS for c in cached):
+        print("FAILURE: A failed lookup must not be cached as \"not found\"")
+        ok = False
+
+    resolver.shutdown()
+    for server in servers:
+        server.shutdown()
+
+    if ok:
+        print("SUCCESS: Name resolver verified.")
+
+if __name__ == "__main__":
+    verify_name_resolver()
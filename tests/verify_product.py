@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from backend.database import database, models, crud
+from backend.catalog import CatalogIndex
 
 def verify_product():
     db = database.SessionLocal()
@@ -19,6 +20,15 @@ def verify_product():
     else:
         print(f"FAILURE: Expected Name='{expected_name}', Price={expected_price}")
 
+    # Same answer from the in-memory catalog, without querying products
+    catalog = CatalogIndex()
+    catalog.load()
+    cached = crud.get_barcode_metadata_batch(db, [barcode], catalog=catalog)[barcode]
+    if cached == (name, price, count):
+        print(f"SUCCESS: Catalog index agrees ({len(catalog)} products loaded).")
+    else:
+        print(f"FAILURE: Catalog index returned {cached}")
+
     db.close()
 
 if __name__ == "__main__":
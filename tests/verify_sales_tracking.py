@@ -1,9 +1,11 @@
 import os
+import openpyxl
 from sqlalchemy.orm import Session
 from backend.database import database, models, crud
 from backend.sales_tracker import SalesTracker
 
 def verify_sales_logging():
+    models.init_db(database.engine)
     db = database.SessionLocal()
     
     # 1. Clear existing codes for clean test
@@ -27,47 +29,55 @@ def verify_sales_logging():
         db.add(db_code)
     db.commit()
 
-    # 3. Simulate "New Client" logic manually
+    # 3. Simulate "New Client" logic (Fetching and Logging)
     print("Simulating 'New Client' logic (Fetching and Logging)...")
-    # We need to manually match the logic in main.py but here we can just use the objects
-    # Note: crud.get_codes returns ORM objects. We need to ensure they have the 'price' attribute.
-    # Actually, the ORM ScannedCode doesn't have 'price' column in DB (it wasn't in the original schema and I didn't add it to ScannedCode model, only Product).
-    # Wait, I should check models.py again.
-    
     codes_to_log = crud.get_codes(db, limit=100)
-    
-    # In main.py, I used: SalesTracker().log_sale(codes)
-    # But wait, ScannedCode model DOES NOT HAVE price column.
-    # Where does price come from?
-    # In get_barcode_metadata, I return (name, price, count).
-    # In service.py, I add 'price' to the 'code' dict.
-    # BUT ScannedCode instances in DB don't store price.
-    
-    # Re-reading models.py:
-    # class ScannedCode(Base):
-    #     ...
-    #     product_name = Column(String, nullable=True)
-    #     timestamp = Column(DateTime, default=datetime.now)
-    
-    # Re-reading service.py aggregation:
-    # code['price'] = price
-    
-    # Re-reading sales_tracker.py log_sale:
-    # price = code.price if code.price is not None else 0.0
-    
-    # If ScannedCode objects from DB don't have .price, this will fail.
-    # I should have added 'price' to ScannedCode model OR I need to look it up during logging.
-    
-    print("Checking if ScannedCode objects have price...")
-    if codes_to_log and not hasattr(codes_to_log[0], 'price'):
-        print("ERROR: ScannedCode objects from DB do not have 'price'. Need to fix models or logging logic.")
-        # I'll modify the tracker to lookup price if missing
+    tracker = SalesTracker()
+    sale_id = tracker.log_sale(codes_to_log)
+
+    sale = db.get(models.Sale, sale_id) if sale_id else None
+    items = db.query(models.SaleItem).filter(models.SaleItem.sale_id == sale_id).all()
+    quantities = {item.barcode: item.quantity for item in items}
+
+    if sale and sale.item_count == 3 and quantities == {"0539099943917": 2, "1084724715128": 1}:
+        print(f"SUCCESS: Sale {sale_id} recorded in the ledger (total {sale.total:.2f}).")
+    else:
+        print(f"FAILURE: Unexpected ledger contents: {quantities}")
+
+    # 4. On-demand Excel export
+    export_path = "sales_export_test.xlsx"
+    tracker.export_xlsx(export_path, start=sale.closed_at if sale else None)
+    wb = openpyxl.load_workbook(export_path, read_only=True)
+    rows = list(wb.active.iter_rows(values_only=True))
+    wb.close()
+    os.remove(export_path)
+
+    if len(rows) == 3 and rows[0][0] == "Fecha y Hora":
+        print("SUCCESS: Sales workbook exported.")
+    else:
+        print(f"FAILURE: Expected header + 2 rows, got {len(rows)} rows.")
+
+    # 5. Atomic close: basket moved to the ledger and emptied together
+    crud.delete_all_codes(db)
+    history_before = sum(r.scan_count for r in db.query(models.ScanStatsMinute).all())
+    for c in test_codes:
+        db.add(models.ScannedCode(data=c["data"], type=c["type"],
+                                  product_name=c["product_name"], price=c["price"]))
+    db.commit()
+
+    closed = tracker.close_sale(db)
+    remaining = db.query(models.ScannedCode).count()
+    if closed and closed.item_count == 3 and remaining == 0:
+        print(f"SUCCESS: Sale {closed.id} closed and basket cleared.")
+    else:
+        print(f"FAILURE: close_sale left {remaining} codes in the basket.")
+
+    # 6. The per-minute scan history keeps the scans of closed sales
+    history_after = sum(r.scan_count for r in db.query(models.ScanStatsMinute).all())
+    if history_after == history_before + len(test_codes):
+        print("SUCCESS: Scan history kept after closing the sale.")
     else:
-        SalesTracker().log_sale(codes_to_log)
-        if os.path.exists("sales.xlsx"):
-            print("SUCCESS: sales.xlsx created.")
-        else:
-            print("FAILURE: sales.xlsx not found.")
+        print(f"FAILURE: Scan history went from {history_before} to {history_after}.")
 
     db.close()
 
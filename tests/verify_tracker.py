@@ -0,0 +1,55 @@
+from backend.vision.tracker import DetectionTracker
+
+def code(data, bbox=(100, 100, 200, 80)):
+    return {"data": data, "type": "EAN13", "bbox": list(bbox)}
+
+def check(label, got, expected):
+    if got == expected:
+        print(f"SUCCESS: {label}")
+    else:
+        print(f"FAILURE: {label} (expected {expected}, got {got})")
+
+def verify_confirmation():
+    tracker = DetectionTracker(confirm_reads=3)
+    reported = [len(tracker.update([code("4006381333931")])) for _ in range(3)]
+    check("Code reported after 3 agreeing reads", reported, [0, 0, 1])
+
+def verify_misread():
+    tracker = DetectionTracker(confirm_reads=2, max_missed=2)
+    tracker.update([code("4006381333931")])
+    tracker.update([code("4006381333931")])
+    # A misread at the same position is outvoted by the track
+    reported = tracker.update([code("4006381333932")])
+    check("Misread at a tracked position is outvoted", [c["data"] for c in reported], ["4006381333931"])
+
+    # A one-off read somewhere else never gets confirmed and is dropped
+    ghost = code("96385074", bbox=(600, 400, 120, 60))
+    reported = tracker.update([code("4006381333931"), ghost])
+    for _ in range(3):
+        reported += tracker.update([code("4006381333931")])
+    check("One-off misread never reported", "96385074" in [c["data"] for c in reported], False)
+    check("One-off misread rejected", tracker.get_stats()["rejected"], 1)
+
+def verify_modes():
+    tracker = DetectionTracker(confirm_reads=2, region_every=2, full_every=4)
+    modes = []
+    for _ in range(8):
+        mode = tracker.next_mode()
+        modes.append(mode)
+        if mode == DetectionTracker.HOLD:
+            tracker.hold()
+        else:
+            tracker.update([code("4006381333931")], mode)
+    F, R, H = DetectionTracker.FULL, DetectionTracker.REGION, DetectionTracker.HOLD
+    check("FULL until confirmed, then REGION/HOLD with a FULL every 4 frames",
+          modes, [F, F, H, R, H, F, H, R])
+
+    # Losing the code sends the tracker back to full frames
+    for _ in range(3):
+        tracker.update([], DetectionTracker.REGION)
+    check("Back to FULL once the code is gone", tracker.next_mode(), F)
+
+if __name__ == "__main__":
+    verify_confirmation()
+    verify_misread()
+    verify_modes()